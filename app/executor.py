@@ -0,0 +1,117 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from recommender.engine import get_engine
+from recommender.metrics import collect_stages
+from recommender.recommend import recommend_vpn
+
+logger = logging.getLogger(__name__)
+
+class ScoringOverloaded(Exception):
+    """Too many scoring jobs are already queued"""
+
+class ScoringTimeout(Exception):
+    """A scoring job did not finish within the request timeout"""
+
+def _init_worker():
+    """Preload the engine once per worker process"""
+    get_engine()
+
+# ``engine`` is taken once per job by ``run_timed``, so the reported
+# version is the one that produced the result even across a reload.
+# ``weights`` is the caller's preference Weights snapshot, passed along so
+# process workers score with the same weights as the main process
+
+def score_one(engine, inputs, weights=None):
+    return recommend_vpn(inputs, weights, engine)
+
+def score_batch(engine, profiles, top_k, weights=None):
+    return engine.recommend_batch(profiles, top_k, weights.values if weights else None)
+
+def score_single(engine, inputs, top_k, weights=None):
+    return engine.recommend(inputs, top_k, weights.values if weights else None)
+
+def run_timed(func, *args):
+    """Run ``func(engine, *args)`` on the current engine and also return its stage timings and version.
+
+    Runs in the worker, so stage timings are collected in process mode too.
+    """
+    engine = get_engine()
+    with collect_stages() as timings:
+        result = func(engine, *args)
+    return result, timings, engine.version
+
+class ScoringExecutor:
+    """Runs CPU-bound scoring off the asyncio event loop.
+
+    ``kind`` is 'thread' or 'process'; process workers load their own engine
+    at start-up. At most ``max_pending`` jobs may be queued or running;
+    further submissions fail fast with ScoringOverloaded so callers can
+    answer 503 instead of piling up work. Each job is also bounded by
+    ``timeout`` seconds.
+    """
+
+    def __init__(self, kind='thread', workers=None, max_pending=None, timeout=10.0):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self.pending = 0
+        self._pool = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            kind=os.getenv('VPN_EXECUTOR', 'thread'),
+            workers=int(os.getenv('VPN_EXECUTOR_WORKERS', 0)) or None,
+            max_pending=int(os.getenv('VPN_MAX_PENDING', 0)) or None,
+            timeout=float(os.getenv('VPN_REQUEST_TIMEOUT', 10))
+        )
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.kind == 'process':
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scoring')
+        logger.info(f"Started {self.kind} scoring pool with {self.workers} workers (max {self.max_pending} pending)")
+
+    def restart(self):
+        """Replace process workers so they load the current artifacts.
+
+        Jobs already running finish in the old pool. Thread workers share
+        the process-wide engine and need no restart.
+        """
+        if self.kind != 'process' or self._pool is None:
+            return
+        old, self._pool = self._pool, None
+        self.start()
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` in the pool and await its result"""
+        if self.pending >= self.max_pending:
+            raise ScoringOverloaded(f"{self.pending} scoring jobs already pending")
+        self.start()
+
+        future = asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+        # Count the job until it really finishes, even if the caller times out
+        self.pending += 1
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise ScoringTimeout(f"Scoring took longer than {self.timeout}s")
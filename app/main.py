@@ -1,12 +1,24 @@
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Form, HTTPException, Body, Query, Header
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, validator, Field
-from typing import Optional, List, Dict
-from recommender.recommend import recommend_vpn
+from typing import Optional, List, Dict, Union
+from recommender.bundle import artifact_stamp
+from recommender.engine import get_engine, reload_engine
+from recommender.metrics import CallbackMetric, collect_stages, registry, stage
+from recommender.preferences import FeedbackQueueFull
+from recommender.recommend import preference_service
+from app.executor import (
+    ScoringExecutor, ScoringOverloaded, ScoringTimeout,
+    run_timed, score_batch, score_one, score_single
+)
+from app.request_log import request_log
+import asyncio
+import hmac
 import logging
 import os
+import time
 from pathlib import Path
 
 # Configure logging
@@ -22,6 +34,22 @@ app = FastAPI(title="VPN Recommender API")
 BASE_DIR = Path(__file__).parent
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
+# Largest number of profiles accepted by one /api/v1/recommend call
+MAX_BATCH_PROFILES = int(os.getenv("VPN_MAX_BATCH_PROFILES", 100))
+
+# Scoring runs in a bounded worker pool so it never blocks the event loop
+scoring = ScoringExecutor.from_env()
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("VPN_ADMIN_TOKEN")
+# Seconds between checks for newly published artifacts (0 disables watching)
+RELOAD_INTERVAL = float(os.getenv("VPN_RELOAD_INTERVAL", 0))
+
+TEMPLATE_RENDER = stage("template_render")
+registry.register(CallbackMetric(
+    "vpn_scoring_pending", "Scoring jobs queued or running", lambda: [((), scoring.pending)]
+))
+
 # Mount static files if needed
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -45,15 +73,62 @@ class VPNRecommendationRequest(BaseModel):
             raise ValueError(f"Invalid encryption. Must be one of: {', '.join(valid_encryptions)}")
         return v
 
+class FeedbackRequest(BaseModel):
+    vpn_name: str = Field(..., min_length=1, description="Name of the recommended VPN")
+    rating: int = Field(..., ge=0, le=1, description="1 if the recommendation was useful, 0 if not")
+
+def to_records(results):
+    """Result rows as dicts; `country_display` is precomputed in the catalog"""
+    return results.to_dict(orient="records")
+
+def log_failure(endpoint, inputs, weights, start, status):
+    """Log a request that got no recommendations, with the status it was answered with"""
+    request_log.log(endpoint, inputs, [], None, weights.version, {}, time.perf_counter() - start, status)
+
+async def reload_artifacts():
+    """Load the current artifacts in the background and swap them in"""
+    old, new = await asyncio.get_running_loop().run_in_executor(None, reload_engine)
+    scoring.restart()
+    logger.info(f"Reloaded artifacts: {old.version if old else None} -> {new.version}")
+    return old, new
+
+async def watch_artifacts(interval):
+    """Reload whenever a new bundle is published"""
+    loop = asyncio.get_running_loop()
+    stamp = await loop.run_in_executor(None, artifact_stamp)
+    while True:
+        await asyncio.sleep(interval)
+        current = await loop.run_in_executor(None, artifact_stamp)
+        if current == stamp:
+            continue
+        stamp = current
+        try:
+            await reload_artifacts()
+        except Exception as e:
+            logger.error(f"Artifact reload failed, keeping the current version: {str(e)}", exc_info=True)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize application resources"""
     logger.info("Starting VPN Recommender application")
+    # Load the model, encoders and catalog once so requests only pay for scoring
+    get_engine()
+    scoring.start()
+    preference_service.start()
+    request_log.start()
+    if RELOAD_INTERVAL > 0:
+        app.state.artifact_watcher = asyncio.create_task(watch_artifacts(RELOAD_INTERVAL))
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources"""
     logger.info("Shutting down application")
+    watcher = getattr(app.state, "artifact_watcher", None)
+    if watcher:
+        watcher.cancel()
+    scoring.shutdown()
+    preference_service.stop()
+    request_log.stop()
 
 @app.get("/", response_class=HTMLResponse)
 async def read_form(request: Request):
@@ -71,108 +146,153 @@ async def get_recommendations(
     trial_available: Optional[str] = Form(None),
     country: Optional[str] = Form(None)
 ):
+    form = {
+        "speed": speed,
+        "price": price,
+        "max_devices": max_devices,
+        "logging_policy": logging_policy,
+        "encryption": encryption,
+        "trial_available": trial_available,
+        "country": country
+    }
+    start = time.perf_counter()
+    weights = preference_service.weights
+    inputs = {key: value for key, value in form.items() if value is not None}
     try:
-        if all(v is None for v in [speed, price, max_devices, logging_policy, encryption, trial_available, country]):
+        if not inputs:
             return templates.TemplateResponse("index.html", {
                 "request": request,
                 "error": "Please provide at least one filter option to get recommendations."
             })
 
-        request_data = VPNRecommendationRequest(
-            speed=speed,
-            price=price,
-            max_devices=max_devices,
-            logging_policy=logging_policy,
-            encryption=encryption,
-            trial_available=trial_available,
-            country=country
-        )
+        request_data = VPNRecommendationRequest(**form)
 
+        # Same inputs as /api/v1/recommend: trial_available stays 'yes'/'no'
         inputs = request_data.dict(exclude_none=True)
-        if 'trial_available' in inputs:
-            inputs['trial_available'] = inputs['trial_available'] == 'yes'
-
-        logger.info(f"Generating recommendations for: {inputs}")
-        results = recommend_vpn(inputs)
-
-        # Map raw country names to standardized display names
-        country_display_map = {
-            "Schweiz/Suisse/Svizzera/Svizra": "Switzerland",
-            "USA": "USA",
-            "United States": "USA",
-            "France": "France",
-            "Italia": "Italy",
-            "United Kingdom": "UK",
-            "Sesel": "Seychelles",
-            "Česko": "Czech Republic",
-            "Sverige": "Sweden",
-            "Danmark": "Denmark",
-            "中国": "Hong Kong",
-            "Canada": "Canada",
-            "Magyarország": "Hungary",
-            "Moldova": "Moldova",
-            "Australia": "Australia",
-            "Deutschland": "Germany",
-            "Ísland": "Iceland",
-            "România": "Romania",
-            "Panamá": "Panama",
-            "Κύπρος - Kıbrıs": "Cyprus",
-            "British Virgin Islands": "British Virgin Islands",
-            "Malaysia مليسيا": "Malaysia",
-            "Suomi / Finland": "Finland",
-            "Belize": "Belize",
-            "Gibraltar": "Gibraltar",
-            "Singapore": "Singapore",
-            "Bosna i Hercegovina / Босна и Херцеговина": "Bosnia",
-            "Norge": "Norway",
-            "British Indian Ocean Territory": "British Indian Ocean",
-            "Nederland": "Netherlands",
-            "Éire / Ireland": "Ireland",
-            "臺灣": "Taiwan",
-            "Maroc ⵍⵎⵖⵔⵉⴱ المغرب": "Morocco",
-            "Mauritius / Maurice": "Mauritius",
-            "India": "India",
-            "Slovensko": "Slovakia",
-            "Barbados": "Barbados",
-            "日本": "Japan",
-            "Polska": "Poland",
-            "Malta": "Malta",
-            "България": "Bulgaria",
-            "ישראל": "Israel",
-            "الإمارات العربية المتحدة": "UAE",
-        }
-
-        recommendations = results.to_dict(orient="records")
-
-        # Add a field `country_display` for template use
-        for r in recommendations:
-            raw = r.get("country", "")
-            r["country_display"] = country_display_map.get(raw, raw)
 
-        return templates.TemplateResponse("index.html", {
-            "request": request,
-            "results": recommendations,
-            "inputs": inputs
-        })
+        logger.debug("Generating recommendations for: %s", inputs)
+        results, timings, version = await scoring.run(run_timed, score_one, inputs, weights)
+
+        recommendations = to_records(results)
+
+        with collect_stages(timings), TEMPLATE_RENDER.time():
+            response = templates.TemplateResponse("index.html", {
+                "request": request,
+                "results": recommendations,
+                "inputs": inputs
+            })
+        request_log.log("/recommend", inputs, recommendations, version, weights.version,
+                        timings, time.perf_counter() - start)
+        return response
 
     except ValueError as e:
         logger.warning(f"Input validation error: {str(e)}")
         return templates.TemplateResponse("index.html", {
             "request": request,
             "error": str(e),
-            "inputs": {
-                "speed": speed,
-                "price": price,
-                "max_devices": max_devices,
-                "logging_policy": logging_policy,
-                "encryption": encryption,
-                "trial_available": trial_available,
-                "country": country
-            }
+            "inputs": form
         })
+    except (ScoringOverloaded, ScoringTimeout) as e:
+        logger.warning(f"Recommendation rejected: {str(e)}")
+        log_failure("/recommend", inputs, weights, start, 503)
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "error": "The recommender is busy right now. Please try again in a moment."
+        }, status_code=503)
     except Exception as e:
         logger.error(f"Recommendation failed: {str(e)}", exc_info=True)
+        log_failure("/recommend", inputs, weights, start, 500)
         return templates.TemplateResponse("error.html", {
             "request": request,
             "error": "We couldn't generate recommendations. Please try again later."
         }, status_code=500)
+
+@app.post("/api/v1/recommend")
+async def api_recommend(
+    profiles: Union[VPNRecommendationRequest, List[VPNRecommendationRequest]] = Body(...),
+    top_k: int = Query(5, ge=1, le=50, description="Recommendations per profile")
+):
+    """JSON recommendations for one profile or a batch of profiles.
+
+    A batch is scored in a single model call across all profiles.
+    """
+    single = isinstance(profiles, VPNRecommendationRequest)
+    if not single and not profiles:
+        raise HTTPException(status_code=422, detail="Provide at least one profile")
+    if not single and len(profiles) > MAX_BATCH_PROFILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_PROFILES} profiles per request")
+
+    start = time.perf_counter()
+    weights = preference_service.weights
+    inputs = profiles.dict(exclude_none=True) if single else [p.dict(exclude_none=True) for p in profiles]
+    try:
+        if single:
+            results, timings, version = await scoring.run(run_timed, score_single, inputs, top_k, weights)
+            records = to_records(results)
+        else:
+            batch, timings, version = await scoring.run(run_timed, score_batch, inputs, top_k, weights)
+            records = [to_records(results) for results in batch]
+    except ScoringOverloaded as e:
+        log_failure("/api/v1/recommend", inputs, weights, start, 503)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ScoringTimeout as e:
+        log_failure("/api/v1/recommend", inputs, weights, start, 503)
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception:
+        log_failure("/api/v1/recommend", inputs, weights, start, 500)
+        raise
+
+    request_log.log("/api/v1/recommend", inputs, records, version, weights.version,
+                    timings, time.perf_counter() - start)
+    if single:
+        return {"recommendations": records}
+    return {"results": [{"recommendations": results} for results in records]}
+
+@app.get("/api/v1/similar")
+def api_similar(
+    name: str = Query(..., min_length=1, description="Name of a catalog VPN"),
+    top_k: int = Query(5, ge=1, le=50, description="Number of similar VPNs"),
+    max_price: Optional[float] = Query(None, ge=0, description="Only VPNs costing at most this much"),
+    logging_policy: Optional[str] = Query(None, pattern="^(no_logs|partial_logs)$", description="Only VPNs with this logging policy"),
+    min_devices: Optional[int] = Query(None, ge=1, description="Only VPNs allowing at least this many devices")
+):
+    """VPNs closest to `name` in speed, price, devices, encryption, country and logging policy.
+
+    Answered from a nearest-neighbour index without scoring; a plain def so
+    FastAPI runs it in its threadpool.
+    """
+    similar = get_engine().similar(name, top_k, max_price, logging_policy, min_devices)
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Unknown VPN: {name}")
+    return {"vpn_name": name, "similar": similar}
+
+@app.post("/api/v1/feedback", status_code=202)
+async def api_feedback(feedback: FeedbackRequest):
+    """Queue a rating for the background preference learner"""
+    features = get_engine().preference_features(feedback.vpn_name)
+    if features is None:
+        raise HTTPException(status_code=404, detail=f"Unknown VPN: {feedback.vpn_name}")
+    try:
+        preference_service.submit(features, feedback.rating)
+    except FeedbackQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return {"queued": True, "weights_version": preference_service.weights.version}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latencies and counters in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/reload")
+async def admin_reload(x_admin_token: Optional[str] = Header(None)):
+    """Load the current artifact bundle and swap it in without a restart"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    try:
+        old, new = await reload_artifacts()
+    except Exception as e:
+        logger.error(f"Artifact reload failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous version: {str(e)}")
+    return {"previous_version": old.version if old else None, "version": new.version}
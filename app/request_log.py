@@ -0,0 +1,199 @@
+"""Structured request log: one JSON line per request, written off the request path.
+
+Requests only build a small dict and put it on a bounded queue through a
+QueueHandler; nothing is serialized or written on the event loop. A
+QueueListener thread serializes the records, appends them in batches and
+rotates the file by size. When the queue is full, records are dropped
+and counted rather than blocking the request.
+
+Each line looks like
+
+    {"ts": "...", "endpoint": "/recommend", "inputs": {...}, "top_k": [...],
+     "scores": [...], "model_version": "...", "weights_version": 0,
+     "timings_ms": {"scoring": 0.41, ...}, "latency_ms": 2.3, "status": 200}
+
+and is the input format of ``benchmarks/replay.py``. Requests answered
+with an error (503 when scoring is overloaded or times out, 500 when it
+fails) are logged too, with empty results and a null model version.
+"""
+import os
+import json
+import queue
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from recommender.metrics import CallbackMetric, registry
+
+class JsonLinesHandler(logging.Handler):
+    """Appends records as JSON lines, flushing in batches and rotating by size.
+
+    Rotation keeps ``backup_count`` old files as ``<path>.1`` ... ``<path>.N``,
+    like RotatingFileHandler.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=5, batch_size=256):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self._buffer = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._stream = open(path, 'a', encoding='utf-8')
+        self._size = self._stream.tell()
+
+    def emit(self, record):
+        try:
+            self._buffer.append(json.dumps(record.msg, separators=(',', ':'), default=str) + '\n')
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        # max_bytes is a file size, so count encoded bytes, not characters
+        size = len(data.encode('utf-8'))
+        if self.max_bytes and self._size and self._size + size > self.max_bytes:
+            self._rotate()
+        self._stream.write(data)
+        self._stream.flush()
+        self._size += size
+
+    def _rotate(self):
+        self._stream.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{i}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._stream = open(self.path, 'a', encoding='utf-8')
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        self._stream.close()
+        super().close()
+
+class _RecordQueueHandler(QueueHandler):
+    """Enqueues records untouched and never blocks or raises when the queue is full"""
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The payload dict is serialized by the listener, not here
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _FlushingListener(QueueListener):
+    """QueueListener that also flushes its handlers when the queue goes idle"""
+
+    def __init__(self, queue_, *handlers, flush_interval=1.0):
+        super().__init__(queue_, *handlers)
+        self.flush_interval = flush_interval
+
+    def enqueue_sentinel(self):
+        # The queue may be full at shutdown; wait for the thread to make room
+        self.queue.put(self._sentinel)
+
+    def dequeue(self, block):
+        if not block:
+            return self.queue.get_nowait()
+        while True:
+            try:
+                return self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+class RequestLog:
+    """Asynchronous JSON-lines request log; a no-op when ``path`` is not set"""
+
+    def __init__(self, path=None, max_bytes=50 * 1024 * 1024, backup_count=5, max_queue=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_queue = max_queue
+        self._handler = None
+        self._listener = None
+        # Drops of handlers already stopped, so the count survives stop()
+        self._dropped = 0
+        self._logger = logging.getLogger('vpn.requests')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv('VPN_REQUEST_LOG') or None,
+            max_bytes=int(os.getenv('VPN_REQUEST_LOG_MAX_BYTES', 50 * 1024 * 1024)),
+            backup_count=int(os.getenv('VPN_REQUEST_LOG_BACKUPS', 5))
+        )
+
+    @property
+    def dropped(self):
+        return self._dropped + (self._handler.dropped if self._handler else 0)
+
+    def start(self):
+        if not self.path or self._handler is not None:
+            return
+        records = queue.Queue(maxsize=self.max_queue)
+        self._listener = _FlushingListener(records, JsonLinesHandler(self.path, self.max_bytes, self.backup_count))
+        self._handler = _RecordQueueHandler(records)
+        self._logger.addHandler(self._handler)
+        self._listener.start()
+
+    def stop(self):
+        """Write out everything queued and close the file"""
+        if self._handler is None:
+            return
+        self._logger.removeHandler(self._handler)
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._dropped += self._handler.dropped
+        self._handler = None
+        self._listener = None
+
+    def log(self, endpoint, inputs, results, model_version, weights_version, timings, latency, status=200):
+        """Queue one request; ``results`` is a list of result records, or a list of them for a batch"""
+        if self._handler is None:
+            return
+        self._logger.info({
+            'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'endpoint': endpoint,
+            'inputs': inputs,
+            'top_k': _pluck(results, 'vpn_name'),
+            'scores': _pluck(results, 'personalized_score'),
+            'model_version': model_version,
+            'weights_version': weights_version,
+            'timings_ms': {name: round(seconds * 1000, 3) for name, seconds in timings.items()},
+            'latency_ms': round(latency * 1000, 3),
+            'status': status
+        })
+
+def _pluck(results, key):
+    if results and isinstance(results[0], list):
+        return [_pluck(batch, key) for batch in results]
+    return [record[key] for record in results]
+
+request_log = RequestLog.from_env()
+registry.register(CallbackMetric(
+    'vpn_request_log_dropped_total', 'Request log lines dropped because the queue was full',
+    lambda: [((), request_log.dropped)], kind='counter'
+))
@@ -0,0 +1,211 @@
+"""Preforked multi-worker server.
+
+The parent imports the app and loads the model, encoders and catalog once,
+freezes the garbage collector (so collections in the workers do not touch,
+and thereby copy, the inherited objects), binds the listening socket and
+then forks the uvicorn workers. Workers share the loaded artifacts
+copy-on-write, and the memory-mapped catalog and forest arrays through the
+page cache, so each extra worker mostly adds its own request state.
+
+    python -m app.serve --workers 4 --port 8000
+
+Startup time and memory of every worker are logged once it accepts
+requests. RSS counts shared pages in every process; PSS splits them among
+the processes sharing them, and "private" is what the worker alone uses.
+Workers that die are restarted.
+
+Each worker runs its own scoring pool and preference learner. With
+VPN_REQUEST_LOG set, worker N writes to ``<name>.N<ext>``; likewise it
+snapshots its learner to ``preferences.N.pkl``, seeded from
+``preferences.pkl`` the first time.
+
+Known limitation: the learners are not shared. Each worker learns only
+from the ratings it happens to receive, so with several workers their
+weights drift apart and a user's recommendations depend on which worker
+answers. Run a single worker if feedback must have one consistent effect.
+"""
+import os
+import gc
+import sys
+import time
+import shutil
+import select
+import signal
+import socket
+import logging
+import argparse
+import threading
+
+import uvicorn
+
+logger = logging.getLogger('app.serve')
+
+def memory_mb(pid='self'):
+    """RSS, PSS and private memory of a process in MB, or {} without /proc (Linux only)"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', encoding='ascii') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    fields[key] = int(value.split()[0]) / 1024
+    except (OSError, ValueError):
+        return {}
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'private': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+    }
+
+def format_memory(usage):
+    if not usage:
+        return "memory n/a"
+    return f"RSS {usage['rss']:.0f} MB, PSS {usage['pss']:.0f} MB, private {usage['private']:.0f} MB"
+
+def preload():
+    """Import the app and load everything workers can share; returns the app"""
+    from app.main import app, templates
+    from recommender.engine import get_engine
+
+    get_engine()
+    for name in templates.env.list_templates():
+        templates.get_template(name)
+    # Move everything loaded so far out of the collector's reach for good
+    gc.collect()
+    gc.freeze()
+    return app
+
+def bind_socket(host, port, backlog=2048):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(index, app, sock, ready_fd, log_level):
+    """Serve ``app`` on the inherited socket; runs in the forked child"""
+    from app.request_log import request_log
+    from recommender.recommend import preference_service
+
+    if request_log.path:
+        root, ext = os.path.splitext(request_log.path)
+        request_log.path = f'{root}.{index}{ext}'
+    if preference_service.snapshot_path:
+        # One snapshot per worker so they do not overwrite each other's
+        # learner; a new worker starts from the shared snapshot
+        shared = preference_service.snapshot_path
+        root, ext = os.path.splitext(shared)
+        preference_service.snapshot_path = f'{root}.{index}{ext}'
+        if os.path.exists(shared) and not os.path.exists(preference_service.snapshot_path):
+            shutil.copyfile(shared, preference_service.snapshot_path)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+
+    def notify_ready():
+        while not server.started:
+            if server.should_exit:
+                return
+            time.sleep(0.01)
+        os.write(ready_fd, f'{index}\n'.encode())
+
+    threading.Thread(target=notify_ready, daemon=True).start()
+    server.run(sockets=[sock])
+
+class Supervisor:
+    """Forks the workers, reports their startup and restarts the ones that die"""
+
+    def __init__(self, app, sock, workers, log_level='info'):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.stopping = False
+        self._children = {}  # pid -> (index, fork time)
+        self._ready_read, self._ready_write = os.pipe()
+
+    def spawn(self, index):
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(self._ready_read)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                run_worker(index, self.app, self.sock, self._ready_write, self.log_level)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+                status = 1
+            finally:
+                os._exit(status)
+        self._children[pid] = (index, started)
+
+    def _report_ready(self):
+        for line in os.read(self._ready_read, 4096).decode('ascii').split():
+            index = int(line)
+            for pid, (child, started) in list(self._children.items()):
+                if child == index:
+                    logger.info(f"Worker {index} (pid {pid}) ready in {time.perf_counter() - started:.2f}s, "
+                                f"{format_memory(memory_mb(pid))}")
+
+    def _reap(self):
+        while self._children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            index, _ = self._children.pop(pid, (None, None))
+            if index is None or self.stopping:
+                continue
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, "
+                           f"restarting it")
+            self.spawn(index)
+
+    def _stop(self, signum, _frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"Received signal {signum}, stopping {len(self._children)} workers")
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self.spawn(index)
+
+        # Single-threaded on purpose: forking a multi-threaded process is unsafe
+        while self._children:
+            readable, _, _ = select.select([self._ready_read], [], [], 0.5)
+            if readable:
+                self._report_ready()
+            self._reap()
+        self.sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the VPN recommender with preforked workers")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+    if not hasattr(os, 'fork'):
+        sys.exit("Preforked serving needs os.fork; use uvicorn --workers on this platform")
+
+    start = time.perf_counter()
+    app = preload()
+    logger.info(f"Loaded artifacts in the parent in {time.perf_counter() - start:.2f}s, "
+                f"{format_memory(memory_mb())}")
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on http://{args.host}:{args.port} with {args.workers} workers")
+    if args.workers > 1:
+        logger.warning("Each worker learns feedback on its own; preference weights will differ between workers")
+    Supervisor(app, sock, args.workers, args.log_level).run()
+
+if __name__ == "__main__":
+    main()
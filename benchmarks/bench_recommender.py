@@ -0,0 +1,283 @@
+"""Benchmarks for the recommendation hot path and the HTTP layer.
+
+Synthetic catalogs are built by resampling the real catalog (so the
+categorical mix stays realistic) and saved as catalog artifacts next to
+the real model, encoders and flattened forest (plus the score table with
+--precompute-scores). Each size is then measured in a fresh subprocess so
+cold start and peak RSS are not polluted by earlier runs. Each result
+also reports which scorer served the requests (it depends on the number
+of candidates) and where the flattened forest stops beating sklearn.
+
+    python benchmarks/bench_recommender.py --sizes 163 10000 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from recommender.catalog import DATA_PATH, ENCODED_COLUMNS, MODEL_DIR, build_catalog, load_catalog, save_catalog
+from recommender.forest import export_forest, load_forest
+from recommender.score_table import export_score_table
+
+DEFAULT_SIZES = [163, 10_000, 100_000, 1_000_000]
+
+# Value space of the HTML form
+ENCRYPTIONS = ['AES-256', 'AES-128', 'ChaCha20', 'Blowfish-128', 'Blowfish-256',
+               'RSA-2048', 'RSA-4096', 'SHA', 'MPPE']
+LOGGING_POLICIES = ['no_logs', 'partial_logs']
+TRIAL_OPTIONS = ['yes', 'no']
+
+def synthetic_catalog(size, seed=0):
+    """Resample the real catalog to ``size`` rows with jittered numeric columns"""
+    source = pd.read_csv(DATA_PATH)
+    rng = np.random.default_rng(seed)
+    df = source.iloc[rng.integers(0, len(source), size)].reset_index(drop=True)
+    df['name'] = [f'VPN-{i}' for i in range(size)]
+    df['speed'] = np.clip(df['speed'] + rng.normal(0, 1, size), 0, None).round(2)
+    df['price'] = np.clip(df['price'] + rng.normal(0, 2, size), 0.5, None).round(2)
+    df['max_devices'] = np.clip(df['max_devices'] + rng.integers(-1, 3, size), 1, None)
+    return df
+
+def synthetic_requests(count, countries, seed=1):
+    """Request mix drawn from the form's value space"""
+    rng = np.random.default_rng(seed)
+    return [{
+        'speed': float(rng.integers(1, 100)),
+        'price': float(rng.integers(1, 20)),
+        'max_devices': int(rng.choice([1, 2, 3, 5, 10])),
+        'logging_policy': str(rng.choice(LOGGING_POLICIES)),
+        'encryption': str(rng.choice(ENCRYPTIONS)),
+        'trial_available': str(rng.choice(TRIAL_OPTIONS)),
+        'country': str(rng.choice(countries))
+    } for _ in range(count)]
+
+def prepare_artifacts(size, workdir, precompute=False):
+    """Model dir with the real model/encoders, its flattened forest and a synthetic catalog artifact.
+
+    With ``precompute`` the score table is built for the synthetic catalog
+    too, as ``train_model.py --precompute-scores`` would.
+    """
+    from joblib import load
+    from recommender.engine import RecommendationEngine, load_encoders
+
+    model_dir = os.path.join(workdir, f'models_{size}')
+    os.makedirs(model_dir, exist_ok=True)
+    for name in ['model.pkl'] + [f'enc_{col}.pkl' for col in ENCODED_COLUMNS]:
+        shutil.copy2(os.path.join(MODEL_DIR, name), model_dir)
+    model_path = os.path.join(model_dir, 'model.pkl')
+    model = load(model_path)
+    encoders = load_encoders()
+    export_forest(model, model_dir, model_path)
+    save_catalog(build_catalog(synthetic_catalog(size), encoders), model_dir)
+    if precompute:
+        engine = RecommendationEngine(model, encoders, load_catalog(model_dir),
+                                      forest=load_forest(model_dir, model_path))
+        export_score_table(engine, model_dir)
+    return model_dir
+
+def scoring_paths(engine, profiles):
+    """Scorer serving each profile on its own, counted, and the scorer for all of them as one batch"""
+    single, total = Counter(), 0
+    for inputs in profiles:
+        features = engine._user_features(inputs)
+        rows = len(engine._candidates(features, inputs))
+        single[engine.scoring_path(features, rows)] += 1
+        total += rows
+    # A batch stacks the candidates of every profile into one matrix
+    batch = engine.scoring_path(engine._user_features(profiles[0]), total) if profiles else None
+    return dict(single), batch
+
+def forest_crossover(engine, sizes=(64, 256, 1024, 2048, 4096, 16384), repeats=5):
+    """Best-of-``repeats`` time (ms) of the flattened forest and of sklearn per candidate count.
+
+    ``suggested_max_rows`` is the largest measured count where the forest
+    is faster, a starting point for VPN_FOREST_MAX_ROWS on this machine.
+    """
+    if engine.forest is None or engine.size == 0:
+        return None
+    from recommender.engine import FEATURE_ORDER
+
+    def best(func):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    features = engine._feature_matrix(engine._user_features({}))
+    features = np.resize(features, (max(sizes), features.shape[1]))
+    timings, suggested = {}, 0
+    for n in sizes:
+        X = features[:n]
+        forest_ms = best(lambda: engine.forest.predict_proba(X))
+        sklearn_ms = best(lambda: engine.model.predict_proba(pd.DataFrame(X, columns=FEATURE_ORDER)))
+        timings[n] = {'forest_ms': forest_ms, 'sklearn_ms': sklearn_ms}
+        if forest_ms < sklearn_ms:
+            suggested = n
+    return {'timings': timings, 'suggested_max_rows': suggested}
+
+def summarize(latencies, elapsed):
+    """Latency percentiles (ms) and throughput for a list of durations (s)"""
+    ms = np.asarray(latencies) * 1000
+    if len(ms) == 0:
+        return {'requests': 0}
+    return {
+        'requests': int(len(ms)),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+        'throughput_rps': float(len(ms) / elapsed) if elapsed > 0 else None
+    }
+
+def timed_loop(func, items, budget):
+    """Call ``func`` on each item until done or ``budget`` seconds have passed"""
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - t0)
+        if time.perf_counter() - start > budget and len(latencies) >= 5:
+            break
+    return summarize(latencies, time.perf_counter() - start)
+
+def peak_rss_mb():
+    """Peak RSS of this process in MB, or None where ``resource`` is unavailable"""
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_size(size, model_dir, requests, budget, http):
+    """Measure one catalog size; runs inside a fresh subprocess"""
+    os.environ.setdefault('VPN_CACHE_SIZE', '0')
+    rss_before = peak_rss_mb()
+
+    import recommender.engine as engine_module
+    from recommender.engine import EngineHolder, RecommendationEngine
+
+    start = time.perf_counter()
+    engine = RecommendationEngine.load(model_dir, data_path=None)
+    cold_start = time.perf_counter() - start
+
+    profiles = synthetic_requests(requests, np.unique(engine.catalog['country']).tolist())
+    result = {
+        'size': size,
+        'scoring_paths': scoring_paths(engine, profiles)[0],
+        'forest_crossover': forest_crossover(engine),
+        'cold_start_s': cold_start,
+        'recommender': timed_loop(engine.recommend, profiles, budget)
+    }
+
+    batch = profiles[:32]
+    start = time.perf_counter()
+    engine.recommend_batch(batch)
+    elapsed = time.perf_counter() - start
+    result['recommender_batch'] = {
+        'profiles': len(batch),
+        'scoring_path': scoring_paths(engine, batch)[1],
+        'elapsed_s': elapsed,
+        'profiles_per_s': len(batch) / elapsed if elapsed > 0 else None
+    }
+
+    if http:
+        from fastapi.testclient import TestClient
+
+        engine_module.engine_holder = EngineHolder(loader=lambda: engine)
+        from app.main import app
+
+        with TestClient(app) as client:
+            result['http_api'] = timed_loop(
+                lambda p: client.post('/api/v1/recommend', json=p).raise_for_status(), profiles, budget
+            )
+            result['http_form'] = timed_loop(
+                lambda p: client.post('/recommend', data=p).raise_for_status(), profiles, budget
+            )
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    result['baseline_rss_mb'] = rss_before
+    return result
+
+def metadata():
+    import sklearn
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the VPN recommender")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="catalog sizes to measure")
+    parser.add_argument('--requests', type=int, default=200, help="requests per size")
+    parser.add_argument('--budget', type=float, default=30.0, help="max seconds per measured loop")
+    parser.add_argument('--no-http', action='store_true', help="skip the FastAPI measurements")
+    parser.add_argument('--precompute-scores', action='store_true',
+                        help="also build the score table for each synthetic catalog")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--worker', nargs=2, metavar=('SIZE', 'MODEL_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        size, model_dir = int(args.worker[0]), args.worker[1]
+        print(json.dumps(run_size(size, model_dir, args.requests, args.budget, not args.no_http)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='vpn_bench_') as workdir:
+        for size in args.sizes:
+            model_dir = prepare_artifacts(size, workdir, args.precompute_scores)
+            cmd = [sys.executable, os.path.abspath(__file__), '--worker', str(size), model_dir,
+                   '--requests', str(args.requests), '--budget', str(args.budget)]
+            if args.no_http:
+                cmd.append('--no-http')
+            proc = subprocess.run(cmd, cwd=BASE_DIR, capture_output=True, text=True)
+            if proc.returncode != 0:
+                results.append({'size': size, 'error': proc.stderr.strip().splitlines()[-1:]})
+                continue
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            print(f"size={size}: p50 {results[-1]['recommender'].get('p50_ms', 0):.1f} ms "
+                  f"(scorers {results[-1]['scoring_paths']})", file=sys.stderr)
+
+    report = json.dumps({'meta': metadata(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
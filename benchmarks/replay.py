@@ -0,0 +1,213 @@
+"""Replay recorded recommendation requests against the recommender.
+
+Reads request streams from the JSON-lines request log (VPN_REQUEST_LOG)
+and from legacy text logs such as vpn_recommendations.log, whose lines
+carry the inputs as a Python dict literal after "Recommendation request:",
+"User inputs:" or "Generating recommendations for:". Other lines are
+skipped.
+
+Requests are sent either in-process (``recommend_vpn`` / the engine) or
+to a running app over HTTP, at a fixed rate or as fast as possible, with
+a bounded number of requests in flight:
+
+    python benchmarks/replay.py vpn_recommendations.log --rate 50 --concurrency 8
+    python benchmarks/replay.py requests.log.jsonl --url http://localhost:8000 --repeat 10
+
+With --rate, latency is measured from the time a request was scheduled,
+so time spent waiting for a free slot counts (no coordinated omission).
+"""
+import os
+import re
+import sys
+import ast
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from benchmarks.bench_recommender import metadata, summarize
+
+LEGACY_PATTERN = re.compile(r'(?:Recommendation request|User inputs|Generating recommendations for): (\{.*\})')
+
+FORM_ENDPOINT = '/recommend'
+API_ENDPOINT = '/api/v1/recommend'
+
+def parse_line(line):
+    """One replayable request ``{'endpoint', 'inputs', 'top_k'}`` from a log line, or None"""
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or 'inputs' not in record:
+            return None
+        endpoint = record.get('endpoint', FORM_ENDPOINT)
+        top_k = record.get('top_k') or []
+        if top_k and isinstance(top_k[0], list):
+            top_k = top_k[0]
+        return {'endpoint': endpoint, 'inputs': record['inputs'], 'top_k': len(top_k) or None}
+
+    match = LEGACY_PATTERN.search(line)
+    if not match:
+        return None
+    try:
+        inputs = ast.literal_eval(match.group(1))
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(inputs, dict):
+        return None
+    return {'endpoint': FORM_ENDPOINT, 'inputs': inputs, 'top_k': None}
+
+def load_requests(paths):
+    """Replayable requests from all files, in order, plus the number of skipped lines"""
+    requests, skipped = [], 0
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                request = parse_line(line)
+                if request is None:
+                    skipped += 1
+                else:
+                    requests.append(request)
+    return requests, skipped
+
+def recorded_inputs(inputs):
+    """Recorded inputs as the app receives them; older logs stored the trial flag as 1/0 or a bool"""
+    if isinstance(inputs, list):
+        return [recorded_inputs(profile) for profile in inputs]
+    inputs = dict(inputs)
+    value = inputs.get('trial_available')
+    if value is not None and not isinstance(value, str):
+        inputs['trial_available'] = 'yes' if value else 'no'
+    return inputs
+
+def form_data(inputs):
+    """HTML form fields for recorded inputs"""
+    return {key: str(value) for key, value in recorded_inputs(inputs).items() if value is not None}
+
+def in_process_target():
+    """Send requests straight to the recommender in this process"""
+    from recommender.engine import get_engine
+    from recommender.recommend import recommend_vpn
+
+    engine = get_engine()
+
+    def send(request):
+        inputs = recorded_inputs(request['inputs'])
+        if request['endpoint'] == FORM_ENDPOINT:
+            recommend_vpn(inputs)
+        elif isinstance(inputs, list):
+            engine.recommend_batch(inputs, request['top_k'] or 5)
+        else:
+            engine.recommend(inputs, request['top_k'] or 5)
+        return 'ok'
+    return send
+
+def http_target(url, timeout):
+    """Send requests to a running app; one connection pool shared by all workers"""
+    import httpx
+
+    client = httpx.Client(base_url=url.rstrip('/'), timeout=timeout,
+                          limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+
+    def send(request):
+        if request['endpoint'] == FORM_ENDPOINT:
+            response = client.post(FORM_ENDPOINT, data=form_data(request['inputs']))
+        else:
+            params = {'top_k': request['top_k']} if request['top_k'] else None
+            response = client.post(request['endpoint'], json=recorded_inputs(request['inputs']), params=params)
+        return str(response.status_code)
+    return send
+
+def replay(send, requests, rate=0.0, concurrency=1):
+    """Send every request and collect latencies and outcomes.
+
+    With ``rate`` > 0 requests are scheduled at fixed intervals (open loop);
+    otherwise each worker sends its next request as soon as the last one
+    finished (closed loop).
+    """
+    latencies, outcomes = [], Counter()
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def run(request, scheduled):
+        try:
+            outcome = send(request)
+        except Exception as e:
+            outcome = type(e).__name__
+        finally:
+            slots.release()
+        elapsed = time.perf_counter() - scheduled
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as pool:
+        for i, request in enumerate(requests):
+            scheduled = start + i / rate if rate > 0 else None
+            if scheduled is not None:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            pool.submit(run, request, scheduled if scheduled is not None else time.perf_counter())
+    return latencies, outcomes, time.perf_counter() - start
+
+def report(latencies, outcomes, elapsed):
+    """Latency summary plus outcome counts; HTTP statuses >= 400 and exceptions are errors"""
+    errors = sum(count for outcome, count in outcomes.items()
+                 if not (outcome == 'ok' or (outcome.isdigit() and int(outcome) < 400)))
+    total = sum(outcomes.values())
+    result = summarize(latencies, elapsed)
+    result['outcomes'] = dict(outcomes)
+    result['errors'] = errors
+    result['error_rate'] = errors / total if total else None
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded recommendation requests")
+    parser.add_argument('logs', nargs='+', help="JSON-lines request logs or legacy text logs")
+    parser.add_argument('--url', help="base URL of a running app (default: call the recommender in-process)")
+    parser.add_argument('--rate', type=float, default=0.0, help="requests per second (0 = as fast as possible)")
+    parser.add_argument('--concurrency', type=int, default=1, help="max requests in flight")
+    parser.add_argument('--repeat', type=int, default=1, help="replay the recorded stream this many times")
+    parser.add_argument('--limit', type=int, help="stop after this many requests")
+    parser.add_argument('--timeout', type=float, default=30.0, help="HTTP timeout in seconds")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    recorded, skipped = load_requests(args.logs)
+    if not recorded:
+        parser.error("no replayable requests found")
+    requests = (recorded * args.repeat)[:args.limit]
+    print(f"Replaying {len(requests)} requests ({len(recorded)} recorded, {skipped} lines skipped)", file=sys.stderr)
+
+    send = http_target(args.url, args.timeout) if args.url else in_process_target()
+    latencies, outcomes, elapsed = replay(send, requests, args.rate, max(args.concurrency, 1))
+
+    result = {
+        'meta': metadata(),
+        'config': {
+            'logs': args.logs,
+            'target': args.url or 'in-process',
+            'rate': args.rate,
+            'concurrency': args.concurrency
+        },
+        'results': report(latencies, outcomes, elapsed)
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
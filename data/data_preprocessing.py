@@ -1,31 +1,153 @@
 import os
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import pandas as pd
 import numpy as np
-from geopy.geocoders import Nominatim
-from transformers import pipeline
 import re
 
-# Initialize AI components
-geolocator = Nominatim(user_agent="vpn_cleaner")
-logging_classifier = pipeline("text-classification", model="distilbert-base-uncased")
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+from recommender.countries import GEOCODED_NAMES, country_code
 
-def load_and_clean_data(input_path, output_path):
+data_dir = os.path.dirname(os.path.abspath(__file__))
+COUNTRY_CACHE_PATH = os.path.join(data_dir, 'country_cache.json')
+
+column_mapping = {
+    'country': 'JURISDICTION BASED IN (COUNTRY)',
+    'speed': 'SPEEDS US SERVER AVERAGE (%)',
+    'price': 'PRICING $ / MONTH (ANNUAL PRICING)',
+    'max_devices': 'AVAILABILITY # OF CONNECTIONS',
+    'encryption': 'SECURITY DEFAULT DATA ENCRYPTION',
+    'strongest_encryption': 'SECURITY STRONGEST DATA ENCRYPTION',
+    'handshake_encryption': 'SECURITY STRONGEST HANDSHAKE ENCRYPTION',
+    'trial_available': 'PRICING FREE TRIAL',
+    'logging_traffic': 'LOGGING LOGS TRAFFIC',
+    'logging_dns': 'LOGGING LOGS DNS REQUESTS'
+}
+
+# AI components are heavy, so they are only loaded on first use
+@lru_cache(maxsize=None)
+def get_geolocator():
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="vpn_cleaner")
+
+@lru_cache(maxsize=None)
+def get_logging_classifier():
+    from transformers import pipeline
+    return pipeline("text-classification", model="distilbert-base-uncased")
+
+def load_and_clean_data(input_path, output_path, resolver=None, workers=None, incremental=False):
     print(f"Loading data from {input_path}")
     df = pd.read_csv(input_path)
-    
+
     try:
         df.columns = df.columns.str.strip().str.upper()
-        df_cleaned = clean_vpn_data(df)
+        resolver = resolver or CountryResolver()
+        hashes = row_hashes(df)
+        previous = load_previous_output(output_path) if incremental else None
+        if previous is None:
+            df_cleaned = clean_vpn_data(df, resolver=resolver, workers=workers)
+        else:
+            df_cleaned = merge_changed_rows(df, hashes, previous, resolver=resolver, workers=workers)
+        resolver.save()
         df_cleaned.to_csv(output_path, index=False)
+        save_row_hashes(output_path, hashes[df_cleaned.index])
         print(f"Saved cleaned data to {output_path} ({len(df_cleaned)} records)")
         return df_cleaned
     except Exception as e:
         print(f"Error cleaning data: {str(e)}")
         raise
 
+# Incremental mode: the hash of the raw row behind every cleaned row is kept
+# next to the output, so unchanged rows can reuse their cleaned values
+
+def row_hashes(df):
+    """Hex hash of every raw row; values are compared as text so dtype inference does not matter"""
+    hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    return hashes.map('{:016x}'.format)
+
+def row_hashes_path(output_path):
+    return f'{output_path}.rows.json'
+
+def save_row_hashes(output_path, hashes):
+    path = row_hashes_path(output_path)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(hashes.tolist(), f)
+    os.replace(tmp, path)
+
+def load_previous_output(output_path):
+    """Previous cleaned rows indexed by raw row hash, or None if unavailable"""
+    try:
+        with open(row_hashes_path(output_path), encoding='utf-8') as f:
+            hashes = json.load(f)
+        previous = pd.read_csv(output_path, keep_default_na=False)
+    except (OSError, ValueError):
+        return None
+    if len(hashes) != len(previous):
+        print("Row hashes do not match the previous output, cleaning everything")
+        return None
+    previous.index = pd.Index(hashes)
+    return previous[~previous.index.duplicated()]
+
+def merge_changed_rows(df, hashes, previous, resolver=None, workers=None):
+    """Clean only rows whose hash is new and reuse the rest from ``previous``"""
+    known = hashes.isin(previous.index)
+    reused = previous.loc[hashes[known]].set_axis(df.index[known])
+    parts = [reused]
+    if not known.all():
+        parts.append(clean_vpn_data(df[~known], resolver=resolver, workers=workers))
+    removed = (~previous.index.isin(hashes)).sum()
+    print(f"Incremental clean: {known.sum()} rows unchanged, {(~known).sum()} re-cleaned, {removed} removed")
+    return pd.concat(parts).sort_index()
+
+class CountryResolver:
+    """Standardizes country names without hitting the network for known values.
+
+    Lookups go through a JSON cache on disk, then the offline gazetteer in
+    ``recommender.countries``, and only when ``online`` is set through the
+    Nominatim geocoder. Every resolved value is written back to the cache.
+    """
+
+    def __init__(self, cache_path=COUNTRY_CACHE_PATH, online=False):
+        self.cache_path = cache_path
+        self.online = online
+        self.cache = {}
+        self._dirty = False
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, encoding='utf-8') as f:
+                self.cache = json.load(f)
+
+    def resolve(self, country):
+        if country in self.cache:
+            return self.cache[country]
+
+        code = country_code(country)
+        if code:
+            resolved = GEOCODED_NAMES[code]
+        elif self.online:
+            resolved = ai_standardize_country(country)
+        else:
+            resolved = country  # fallback
+        self.cache[country] = resolved
+        self._dirty = True
+        return resolved
+
+    def save(self):
+        if not self.cache_path or not self._dirty:
+            return
+        tmp = f'{self.cache_path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, self.cache_path)
+        self._dirty = False
+
 def ai_standardize_country(country):
     try:
-        location = geolocator.geocode(country)
+        location = get_geolocator().geocode(country)
         if location:
             return location.address.split(",")[-1].strip()
     except:
@@ -34,13 +156,20 @@ def ai_standardize_country(country):
 
 def ai_classify_logging(text):
     if pd.isna(text): return 'no_logs'
-    result = logging_classifier(text[:512])
+    result = get_logging_classifier()(text[:512])
     return 'no_logs' if result[0]['label'].upper() == 'NO_LOGS' else 'partial_logs'
 
+def map_unique(series, func):
+    """Apply ``func`` once per distinct value of ``series``"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    results = np.empty(len(uniques), dtype=object)
+    results[:] = [func(value) for value in uniques]
+    return pd.Series(results[codes], index=series.index)
+
 def standardize_encryption(text):
     if not isinstance(text, str) or str(text).strip().lower() in ['', 'nan', 'none']:
         return 'Unknown'
-    
+
     text = str(text).strip().upper()
     # Handle multiple encryption types separated by slashes or commas
     if '/' in text or ',' in text:
@@ -49,12 +178,12 @@ def standardize_encryption(text):
         for enc in encryptions:
             standardized.append(standardize_single_encryption(enc.strip()))
         return ', '.join(filter(lambda x: x != 'Unknown', standardized))
-    
+
     return standardize_single_encryption(text)
 
 def standardize_single_encryption(text):
     text = re.sub(r'[\s\-_]', '', text.upper())
-    
+
     # Match common encryption algorithms with improved patterns
     patterns = [
         (r'AES(\d+)', 'AES-{}'),
@@ -70,42 +199,31 @@ def standardize_single_encryption(text):
         (r'3DES', '3DES'),
         (r'RC4', 'RC4')
     ]
-    
+
     for pattern, replacement in patterns:
         match = re.search(pattern, text)
         if match:
             if '{}' in replacement:
                 return replacement.format(match.group(1))
             return replacement
-            
+
     return 'Unknown'
 
-def clean_vpn_data(df):
-    # First ensure the VPN name column exists
-    if 'VPN SERVICE' not in df.columns:
-        raise ValueError("VPN name column 'VPN SERVICE' not found in dataset")
-    
-    # Create the name column first
-    df['name'] = df['VPN SERVICE'].str.strip()
-    
-    column_mapping = {
-        'country': 'JURISDICTION BASED IN (COUNTRY)',
-        'speed': 'SPEEDS US SERVER AVERAGE (%)',
-        'price': 'PRICING $ / MONTH (ANNUAL PRICING)',
-        'max_devices': 'AVAILABILITY # OF CONNECTIONS',
-        'encryption': 'SECURITY DEFAULT DATA ENCRYPTION',
-        'strongest_encryption': 'SECURITY STRONGEST DATA ENCRYPTION',
-        'handshake_encryption': 'SECURITY STRONGEST HANDSHAKE ENCRYPTION',
-        'trial_available': 'PRICING FREE TRIAL',
-        'logging_traffic': 'LOGGING LOGS TRAFFIC',
-        'logging_dns': 'LOGGING LOGS DNS REQUESTS'
-    }
+def combine_encryption(default, strongest, handshake):
+    """Distinct known encryption types, in default/strongest/handshake order"""
+    combined = [x for x in dict.fromkeys([str(default), str(strongest), str(handshake)]) if x != 'Unknown']
+    return ', '.join(combined) or 'Unknown'
+
+# Independent cleaning stages; each returns new columns indexed like df
 
-    # Process basic columns
-    df['speed'] = pd.to_numeric(df.get(column_mapping['speed'], 50), errors='coerce').fillna(50) * 0.1
-    df['price'] = pd.to_numeric(df.get(column_mapping['price'], 10), errors='coerce').fillna(10.0)
-    df['max_devices'] = pd.to_numeric(df.get(column_mapping['max_devices'], 1), errors='coerce').fillna(1).astype(int)
+def clean_numeric(df):
+    return pd.DataFrame({
+        'speed': pd.to_numeric(df.get(column_mapping['speed'], 50), errors='coerce').fillna(50) * 0.1,
+        'price': pd.to_numeric(df.get(column_mapping['price'], 10), errors='coerce').fillna(10.0),
+        'max_devices': pd.to_numeric(df.get(column_mapping['max_devices'], 1), errors='coerce').fillna(1).astype(int)
+    }, index=df.index)
 
+def clean_logging(df):
     # Process logging policies
     logging_fields = [
         column_mapping['logging_traffic'],
@@ -114,62 +232,73 @@ def clean_vpn_data(df):
         'LOGGING LOGS BANDWIDTH',
         'LOGGING LOGS IP ADDRESS'
     ]
+    no_logs = pd.Series(True, index=df.index)
+    for field in logging_fields:
+        if field in df.columns:
+            no_logs &= df[field].astype(str).str.strip().str.lower().isin(['no', 'nan', ''])
+    return pd.DataFrame({'logging_policy': np.where(no_logs, 'no_logs', 'partial_logs')}, index=df.index)
 
-    df['logging_policy'] = df.apply(
-        lambda row: 'no_logs' if all(
-            str(row.get(field, 'no')).strip().lower() in ['no', 'nan', '']
-            for field in logging_fields
-        ) else 'partial_logs',
-        axis=1
-    )
-
+def clean_encryption(df):
     # Process encryption columns
-    for enc_type in ['encryption', 'strongest_encryption', 'handshake_encryption']:
-        if column_mapping[enc_type] not in df.columns:
-            df[column_mapping[enc_type]] = 'Unknown'
-
-    df['default_encryption'] = df[column_mapping['encryption']].apply(standardize_encryption)
-    df['strongest_encryption'] = df[column_mapping['strongest_encryption']].apply(standardize_encryption)
-    df['handshake_encryption'] = df[column_mapping['handshake_encryption']].apply(standardize_encryption)
+    sources = {
+        'default_encryption': column_mapping['encryption'],
+        'strongest_encryption': column_mapping['strongest_encryption'],
+        'handshake_encryption': column_mapping['handshake_encryption']
+    }
+    cleaned = pd.DataFrame({
+        name: map_unique(df[col], standardize_encryption) if col in df.columns else 'Unknown'
+        for name, col in sources.items()
+    }, index=df.index)
 
     # Combine encryption info
-    df['encryption'] = df.apply(
-        lambda row: ', '.join(filter(
-            lambda x: x != 'Unknown',
-            set([str(row['default_encryption']), str(row['strongest_encryption']), str(row['handshake_encryption'])])
-        )) or 'Unknown',
-        axis=1
-    )
+    triples = pd.Series(list(zip(cleaned['default_encryption'], cleaned['strongest_encryption'],
+                                 cleaned['handshake_encryption'])), index=df.index)
+    cleaned['encryption'] = map_unique(triples, lambda t: combine_encryption(*t))
+    return cleaned
 
+def clean_trial(df):
     # Process other columns
-    df['trial_available'] = df.get(column_mapping['trial_available'], 'No').map(
-        {'Yes': 'yes', 'No': 'no'}
-    ).fillna('no')
+    trial = df.get(column_mapping['trial_available'], pd.Series('No', index=df.index))
+    return pd.DataFrame({'trial_available': trial.map({'Yes': 'yes', 'No': 'no'}).fillna('no')}, index=df.index)
+
+def clean_country(df, resolver):
+    countries = df.get(column_mapping['country'], pd.Series('Unknown', index=df.index))
+    return pd.DataFrame({
+        'country': map_unique(countries, lambda x: resolver.resolve(x) if pd.notna(x) else 'Unknown')
+    }, index=df.index)
+
+def clean_vpn_data(df, resolver=None, workers=None):
+    # First ensure the VPN name column exists
+    if 'VPN SERVICE' not in df.columns:
+        raise ValueError("VPN name column 'VPN SERVICE' not found in dataset")
+
+    resolver = resolver or CountryResolver()
+    stages = [clean_numeric, clean_logging, clean_encryption, clean_trial, lambda d: clean_country(d, resolver)]
+    with ThreadPoolExecutor(max_workers=workers or len(stages)) as pool:
+        parts = list(pool.map(lambda stage: stage(df), stages))
 
-    df['country'] = df.get(column_mapping['country'], 'Unknown').apply(
-        lambda x: ai_standardize_country(x) if pd.notna(x) else 'Unknown'
-    )
+    cleaned = pd.concat([df['VPN SERVICE'].str.strip().rename('name')] + parts, axis=1)
 
     # Select final columns
-    final_columns = {
-        'name': 'name',
-        'country': 'country',
-        'speed': 'speed',
-        'price': 'price',
-        'max_devices': 'max_devices',
-        'logging_policy': 'logging_policy',
-        'encryption': 'encryption',
-        'default_encryption': 'default_encryption',
-        'strongest_encryption': 'strongest_encryption',
-        'handshake_encryption': 'handshake_encryption',
-        'trial_available': 'trial_available'
-    }
+    final_columns = [
+        'name', 'country', 'speed', 'price', 'max_devices',
+        'logging_policy', 'encryption', 'default_encryption',
+        'strongest_encryption', 'handshake_encryption', 'trial_available'
+    ]
 
-    return df[list(final_columns.keys())].rename(columns=final_columns).dropna()
+    return cleaned[final_columns].dropna()
 
 if __name__ == "__main__":
-    base = os.path.dirname(os.path.abspath(__file__))
-    raw_path = os.path.join(base, 'vpn_data_real.csv')
-    cleaned_path = os.path.join(base, 'cleaned_vpn_data.csv')
+    parser = argparse.ArgumentParser(description="Clean the raw VPN dataset")
+    parser.add_argument('--online', action='store_true',
+                        help="geocode countries missing from the offline gazetteer with Nominatim")
+    parser.add_argument('--workers', type=int, help="threads for the independent cleaning stages")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only re-clean raw rows that changed since the last run")
+    args = parser.parse_args()
+
+    raw_path = os.path.join(data_dir, 'vpn_data_real.csv')
+    cleaned_path = os.path.join(data_dir, 'cleaned_vpn_data.csv')
     os.makedirs(os.path.dirname(cleaned_path), exist_ok=True)
-    load_and_clean_data(raw_path, cleaned_path)
\ No newline at end of file
+    load_and_clean_data(raw_path, cleaned_path, resolver=CountryResolver(online=args.online),
+                        workers=args.workers, incremental=args.incremental)
@@ -1,35 +1,123 @@
 import os
+import sys
+import time
+import argparse
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.semi_supervised import LabelPropagation
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-from joblib import dump
+from joblib import dump, load
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 data_path = os.path.join(base, 'data', 'cleaned_vpn_data.csv')
 model_dir = os.path.join(base, 'models')
 os.makedirs(model_dir, exist_ok=True)
 
-def load_data():
-    df = pd.read_csv(data_path)
+sys.path.insert(0, base)
+from recommender.bundle import publish_bundle, read_manifest, write_manifest
+from recommender.catalog import ENCODED_COLUMNS, build_catalog, load_catalog, patch_catalog, save_catalog
+from recommender.encoders import FrozenEncoder, extend_label_encoder
+from recommender.forest import export_forest, load_forest
+from recommender.parity import forest_parity
+from recommender.engine import RecommendationEngine, load_encoders
+from recommender.score_table import SCORES_DIRNAME, export_score_table
+
+# Above this many rows the dense n x n RBF affinity matrix of label
+# propagation gets too big (10k rows ~ 800 MB) and the kNN graph is used
+RBF_MAX_ROWS = 10_000
+# Neighbours per row in the sparse kNN label graph
+KNN_NEIGHBORS = 7
+
+def _rss_mb():
+    """Current resident set size in MB, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class StageReport:
+    """Wall time and memory of each training stage, printed at the end"""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            rss_after = _rss_mb()
+            self.stages.append({
+                'stage': name,
+                'seconds': time.perf_counter() - start,
+                'rss_mb': rss_after,
+                'rss_delta_mb': rss_after - rss_before if rss_after is not None else None,
+                'peak_rss_mb': _peak_rss_mb()
+            })
+
+    def print(self):
+        if not self.stages:
+            return
+        print(f"{'stage':<22}{'seconds':>10}{'rss MB':>10}{'delta MB':>10}{'peak MB':>10}")
+        for s in self.stages:
+            memory = ''.join(f'{v:10.1f}' if v is not None else f'{"-":>10}'
+                             for v in (s['rss_mb'], s['rss_delta_mb'], s['peak_rss_mb']))
+            print(f"{s['stage']:<22}{s['seconds']:10.2f}{memory}")
+        print(f"{'total':<22}{sum(s['seconds'] for s in self.stages):10.2f}")
+
+report = StageReport()
+
+def label_model(rows, scalable=False, n_jobs=None):
+    """Label propagation over a dense RBF graph, or a sparse kNN graph for large catalogs.
+
+    The kNN graph keeps KNN_NEIGHBORS edges per row, so memory grows
+    linearly with the catalog instead of quadratically.
+    """
+    if scalable or rows > RBF_MAX_ROWS:
+        if not scalable:
+            print(f"{rows} rows is too many for the RBF label graph, using the kNN graph")
+        return LabelPropagation(kernel='knn', n_neighbors=min(KNN_NEIGHBORS, rows - 1), n_jobs=n_jobs)
+    return LabelPropagation(kernel='rbf')
+
+def load_data(scalable=False, n_jobs=None):
+    with report.stage('read csv'):
+        df = pd.read_csv(data_path)
     
-    # Convert yes/no to 1/0
-    df['trial_available'] = df['trial_available'].map({'yes': 1, 'no': 0})
+    with report.stage('encode'):
+        # Convert yes/no to 1/0
+        df['trial_available'] = df['trial_available'].map({'yes': 1, 'no': 0})
     
-    # Encode categorical columns
-    categorical_cols = ['country', 'logging_policy', 'encryption', 
-                        'default_encryption', 'strongest_encryption', 
-                        'handshake_encryption']
+        # Encode categorical columns
+        categorical_cols = ['country', 'logging_policy', 'encryption', 
+                            'default_encryption', 'strongest_encryption', 
+                            'handshake_encryption']
     
-    encoders = {}
-    for col in categorical_cols:
-        if col in df.columns:
-            encoder = LabelEncoder()
-            df[f'{col}_encoded'] = encoder.fit_transform(df[col].astype(str))
-            encoders[col] = encoder
-            dump(encoder, os.path.join(model_dir, f'enc_{col}.pkl'))
+        encoders = {}
+        for col in categorical_cols:
+            if col in df.columns:
+                encoder = LabelEncoder().fit(df[col].astype(str))
+                dump(encoder, os.path.join(model_dir, f'enc_{col}.pkl'))
+                # Encode through the same lookup table the recommender uses
+                encoders[col] = FrozenEncoder.from_label_encoder(encoder)
+                df[f'{col}_encoded'] = encoders[col].encode_array(df[col].astype(str))
     
     # AI-enhanced label generation
     X = df[['speed', 'price', 'max_devices', 'country_encoded']].values
@@ -42,12 +130,13 @@ def load_data():
     )
     
     # Refine labels with semi-supervised learning
-    label_prop = LabelPropagation(kernel='rbf').fit(X, y)
-    df['label'] = label_prop.transduction_
+    with report.stage('label propagation'):
+        label_prop = label_model(len(df), scalable, n_jobs).fit(X, y)
+        df['label'] = label_prop.transduction_
     return df, encoders
 
-def train():
-    df, encoders = load_data()
+def train(publish=False, precompute=False, scalable=False, n_jobs=-1):
+    df, encoders = load_data(scalable, n_jobs)
     
     # Prepare features - include all available columns
     feature_cols = [
@@ -67,18 +156,126 @@ def train():
         X, y, test_size=0.2, random_state=42
     )
     
-    # Train model
-    model = RandomForestClassifier(
-        n_estimators=100, 
-        class_weight='balanced', 
-        random_state=42
-    )
-    model.fit(X_train, y_train)
+    # Train model; trees are fitted in parallel, which does not change the
+    # fitted forest for a fixed random_state
+    with report.stage('fit forest'):
+        model = RandomForestClassifier(
+            n_estimators=100, 
+            class_weight='balanced', 
+            random_state=42,
+            n_jobs=n_jobs
+        )
+        model.fit(X_train, y_train)
+        # Serving chooses its own parallelism
+        model.n_jobs = None
     
     # Save model and print accuracy
-    dump(model, os.path.join(model_dir, 'model.pkl'))
+    model_path = os.path.join(model_dir, 'model.pkl')
+    with report.stage('save model'):
+        dump(model, model_path)
     print(f"Model trained. Accuracy: {model.score(X_test, y_test):.2f}")
     print(f"Features used: {available_features}")
 
+    with report.stage('export forest'):
+        export_inference_forest(model, model_path, X.to_numpy(dtype=float))
+
+    with report.stage('export catalog'):
+        export_catalog(encoders)
+    if precompute or os.path.isdir(os.path.join(model_dir, SCORES_DIRNAME)):
+        with report.stage('precompute scores'):
+            export_scores(model)
+
+    with report.stage('manifest'):
+        manifest = write_manifest(model_dir)
+    print(f"Artifact version: {manifest['version']}")
+    with report.stage('check bundle'):
+        check_bundle()
+    if publish:
+        with report.stage('publish'):
+            print(f"Published bundle to {publish_bundle(model_dir)}")
+
+def update(publish=False, precompute=False):
+    """Ship catalog changes without refitting the label model or the forest.
+
+    Encoders are extended append-only so existing codes, and with them the
+    trained model, stay valid; only new or changed catalog rows are rebuilt.
+    """
+    if not os.path.exists(os.path.join(model_dir, 'model.pkl')):
+        print("No trained model found, running a full training instead")
+        return train(publish, precompute)
+
+    df = pd.read_csv(data_path)
+    encoders = {}
+    for col in ENCODED_COLUMNS:
+        if col in df.columns:
+            path = os.path.join(model_dir, f'enc_{col}.pkl')
+            encoder = load(path)
+            added = extend_label_encoder(encoder, df[col].astype(str))
+            if added:
+                dump(encoder, path)
+                print(f"Encoder {col}: appended {added}")
+            encoders[col] = FrozenEncoder.from_label_encoder(encoder)
+
+    rebuilt = patch_catalog(df, encoders, model_dir, source_path=data_path)
+    print(f"Catalog patched: {rebuilt} of {len(df)} VPNs rebuilt")
+    if precompute or os.path.isdir(os.path.join(model_dir, SCORES_DIRNAME)):
+        export_scores(load(os.path.join(model_dir, 'model.pkl')))
+
+    manifest = write_manifest(model_dir)
+    print(f"Artifact version: {manifest['version']}")
+    check_bundle()
+    if publish:
+        print(f"Published bundle to {publish_bundle(model_dir)}")
+
+def export_inference_forest(model, model_path, X):
+    """Write the flattened forest and check it scores exactly like sklearn"""
+    path = export_forest(model, model_dir, model_path)
+    diff = forest_parity(model, load_forest(model_dir, model_path), X)
+    if diff > 0:
+        raise RuntimeError(f"Flattened forest differs from sklearn by {diff}")
+    print(f"Inference forest exported to {path} (matches sklearn on {len(X)} rows)")
+
+def export_scores(model):
+    """Precompute the base score of every VPN for every user combination.
+
+    The engine is built from the artifacts just written rather than through
+    ``RecommendationEngine.load``, whose manifest check would reject them
+    until the manifest is rewritten.
+    """
+    model_path = os.path.join(model_dir, 'model.pkl')
+    engine = RecommendationEngine(model, load_encoders(model_dir), load_catalog(model_dir),
+                                  forest=load_forest(model_dir, model_path))
+    path = export_score_table(engine, model_dir)
+    print(f"Score table exported to {path} ({engine.size} VPNs)")
+
+def check_bundle():
+    """Load the written artifacts the way serving does; raises BundleError if they do not match the manifest"""
+    read_manifest(model_dir)
+    engine = RecommendationEngine.load(model_dir, data_path=None)
+    scorer = 'score table' if engine.score_table is not None else 'model'
+    print(f"Bundle loads: {engine.size} VPNs scored by the {scorer}")
+
+def export_catalog(encoders):
+    """Write the pre-encoded serving catalog next to the model"""
+    catalog = build_catalog(pd.read_csv(data_path), encoders)
+    path = save_catalog(catalog, model_dir, source_path=data_path)
+    print(f"Catalog exported to {path} ({len(catalog['name'])} VPNs)")
+
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the VPN ranking model")
+    parser.add_argument('--publish', action='store_true',
+                        help="copy the artifacts into models/bundles/ and make them the served version")
+    parser.add_argument('--incremental', action='store_true',
+                        help="keep the trained model and only patch encoders and catalog for a changed CSV")
+    parser.add_argument('--precompute-scores', action='store_true',
+                        help="store the base score of every VPN for every user combination in the bundle")
+    parser.add_argument('--scalable', action='store_true',
+                        help=f"use the sparse kNN label graph (automatic above {RBF_MAX_ROWS} rows)")
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help="parallel jobs for forest fitting and the kNN graph (-1 = all cores)")
+    args = parser.parse_args()
+    if args.incremental:
+        update(publish=args.publish, precompute=args.precompute_scores)
+    else:
+        train(publish=args.publish, precompute=args.precompute_scores, scalable=args.scalable, n_jobs=args.jobs)
+    report.print()
\ No newline at end of file
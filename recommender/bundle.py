@@ -0,0 +1,135 @@
+"""Versioned artifact bundles: model, encoders and catalog plus a manifest.
+
+A bundle is a directory holding ``model.pkl``, the ``enc_*.pkl`` encoders,
+the ``catalog/`` and ``forest/`` artifacts, optionally the precomputed
+``scores/`` table, and a ``manifest.json`` with the SHA-256 of each file. Its version is derived from those checksums.
+
+Published bundles live in ``models/bundles/<version>/``. The file
+``models/bundles/CURRENT`` names the active one and is swapped with an
+atomic rename, so a reader always sees a complete bundle.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+from recommender.catalog import CATALOG_DIRNAME, ENCODED_COLUMNS, MODEL_DIR, file_checksum
+from recommender.forest import FOREST_DIRNAME
+from recommender.score_table import SCORES_DIRNAME
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+BUNDLES_DIR = os.path.join(MODEL_DIR, 'bundles')
+CURRENT_NAME = 'CURRENT'
+
+class BundleError(Exception):
+    """A bundle is incomplete or does not match its manifest"""
+
+def bundle_files(model_dir):
+    """Artifact paths of a bundle, relative to ``model_dir``"""
+    files = ['model.pkl'] + [f'enc_{col}.pkl' for col in ENCODED_COLUMNS]
+    for dirname in [CATALOG_DIRNAME, FOREST_DIRNAME, SCORES_DIRNAME]:
+        artifact_dir = os.path.join(model_dir, dirname)
+        if os.path.isdir(artifact_dir):
+            files += [f'{dirname}/{name}' for name in sorted(os.listdir(artifact_dir))]
+    return [f for f in files if os.path.exists(os.path.join(model_dir, f))]
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def write_manifest(model_dir=MODEL_DIR):
+    """Checksum every artifact in ``model_dir`` and write its manifest"""
+    files = {name: file_checksum(os.path.join(model_dir, name)) for name in bundle_files(model_dir)}
+    if 'model.pkl' not in files:
+        raise BundleError(f"No model.pkl in {model_dir}")
+    digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()
+    manifest = {
+        'version': digest[:16],
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'files': files
+    }
+    _write_json(os.path.join(model_dir, MANIFEST_NAME), manifest)
+    return manifest
+
+def read_manifest(bundle_dir, verify=True):
+    """The bundle's manifest, or None if it has none.
+
+    With ``verify`` every listed file is re-hashed and a BundleError is
+    raised on any mismatch.
+    """
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise BundleError(f"Unreadable manifest in {bundle_dir}: {e}")
+
+    if verify:
+        for name, checksum in manifest['files'].items():
+            path = os.path.join(bundle_dir, name)
+            if not os.path.exists(path):
+                raise BundleError(f"{name} is missing from bundle {bundle_dir}")
+            if file_checksum(path) != checksum:
+                raise BundleError(f"{name} does not match the manifest of {bundle_dir}")
+    return manifest
+
+def is_published(model_dir, bundles_dir=BUNDLES_DIR):
+    """Whether ``model_dir`` is a published bundle under ``bundles_dir``"""
+    bundles_dir = os.path.realpath(bundles_dir)
+    return os.path.dirname(os.path.realpath(model_dir)) == bundles_dir
+
+def publish_bundle(model_dir=MODEL_DIR, bundles_dir=BUNDLES_DIR):
+    """Copy the artifacts of ``model_dir`` into a new bundle and make it current"""
+    manifest = write_manifest(model_dir)
+    version = manifest['version']
+    target = os.path.join(bundles_dir, version)
+
+    if not os.path.isdir(target):
+        tmp = f'{target}.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        for name in list(manifest['files']) + [MANIFEST_NAME]:
+            dest = os.path.join(tmp, name)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copy2(os.path.join(model_dir, name), dest)
+        read_manifest(tmp)
+        os.replace(tmp, target)
+
+    pointer = os.path.join(bundles_dir, CURRENT_NAME)
+    tmp_pointer = f'{pointer}.tmp'
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer)
+    logger.info(f"Published bundle {version}")
+    return target
+
+def current_version(bundles_dir=BUNDLES_DIR):
+    """Version named by bundles/CURRENT, or None if nothing is published"""
+    try:
+        with open(os.path.join(bundles_dir, CURRENT_NAME), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def resolve_model_dir(model_dir=MODEL_DIR, bundles_dir=BUNDLES_DIR):
+    """Directory to load artifacts from: the current bundle, else ``model_dir``"""
+    version = current_version(bundles_dir)
+    if version and os.path.isdir(os.path.join(bundles_dir, version)):
+        return os.path.join(bundles_dir, version)
+    return model_dir
+
+def artifact_stamp(model_dir=MODEL_DIR, bundles_dir=BUNDLES_DIR):
+    """Cheap value that changes whenever the artifacts to load change"""
+    version = current_version(bundles_dir)
+    if version:
+        return version
+    try:
+        return os.stat(os.path.join(model_dir, MANIFEST_NAME)).st_mtime_ns
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,92 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Inputs that only matter through str(value).lower() in the engine
+_CASE_INSENSITIVE = {'trial_available'}
+
+class ResultCache:
+    """Bounded LRU cache of recommendation results with a time-to-live.
+
+    Keys combine the normalized request inputs with the version of the
+    loaded artifacts. When a request arrives for a new version the old
+    entries are dropped, so a reload never serves stale results.
+    ``quantize`` optionally rounds speed/price to a grid (e.g. 0.5) so
+    near-identical requests share an entry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0, quantize=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.quantize = quantize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def normalize(self, inputs):
+        """Inputs as the engine will see them, with speed/price quantized"""
+        normalized = {}
+        for name, value in inputs.items():
+            if isinstance(value, str):
+                value = value.strip()
+            if name in _CASE_INSENSITIVE:
+                value = str(value).lower()
+            elif name in ('speed', 'price') and value is not None:
+                value = float(value)
+                if self.quantize:
+                    value = round(round(value / self.quantize) * self.quantize, 6)
+            normalized[name] = value
+        return normalized
+
+    def get_or_compute(self, inputs, version, compute):
+        """Return the cached result for ``inputs`` or store ``compute(inputs)``.
+
+        ``compute`` receives the normalized inputs, so every request that
+        maps to a key gets exactly the result stored under it.
+        """
+        if self.maxsize <= 0:
+            return compute(inputs)
+
+        normalized = self.normalize(inputs)
+        key = (version, tuple(sorted(normalized.items())))
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or entry[0] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].copy()
+            self.misses += 1
+
+        result = compute(normalized)
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (now + self.ttl if self.ttl is not None else None, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result.copy()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'version': self._version
+            }
@@ -0,0 +1,187 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from recommender.countries import country_ids, display_names
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(BASE_DIR, 'models')
+DATA_PATH = os.path.join(BASE_DIR, 'data', 'cleaned_vpn_data.csv')
+
+# Bump whenever the on-disk layout or column semantics change
+CATALOG_VERSION = 2
+CATALOG_DIRNAME = 'catalog'
+
+# Categorical columns with a fitted enc_<col>.pkl encoder
+ENCODED_COLUMNS = [
+    'country', 'logging_policy', 'encryption',
+    'default_encryption', 'strongest_encryption',
+    'handshake_encryption'
+]
+
+NUMERIC_COLUMNS = ['speed', 'price', 'max_devices']
+
+# Text columns kept for display and filtering
+TEXT_COLUMNS = [
+    'name', 'country', 'logging_policy', 'encryption',
+    'default_encryption', 'strongest_encryption',
+    'handshake_encryption', 'trial_available'
+]
+
+# Fill missing encryption data
+ENCRYPTION_DEFAULTS = {
+    'encryption': 'AES-256',
+    'default_encryption': 'AES-256',
+    'strongest_encryption': 'AES-256',
+    'handshake_encryption': 'RSA-4096'
+}
+
+def clean_catalog(df):
+    """Replace missing encryption values with their defaults"""
+    df = df.copy()
+    for col, default in ENCRYPTION_DEFAULTS.items():
+        if col in df.columns:
+            df[col] = df[col].replace(['Unknown', 'nan', '', None], default).fillna(default)
+    return df
+
+def file_checksum(path):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def save_artifact_dir(target, arrays, manifest):
+    """Write one .npy per array plus ``manifest`` into ``target``.
+
+    Everything is written to ``<target>.tmp`` and swapped in with renames,
+    so readers never see a half-written artifact. Returns ``target``.
+    """
+    tmp = f'{target}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), values)
+    with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    old = f'{target}.old'
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(target):
+        os.replace(target, old)
+    os.replace(tmp, target)
+    shutil.rmtree(old, ignore_errors=True)
+    return target
+
+def read_artifact_manifest(path, version, kind):
+    """Manifest of the artifact in ``path``, or None if it is missing, unreadable or not ``version``"""
+    try:
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != version:
+        logger.warning(f"Ignoring {kind} artifact version {manifest.get('version')}, expected {version}")
+        return None
+    return manifest
+
+def source_columns(df):
+    """Numeric and text columns of an already cleaned catalog DataFrame"""
+    columns = {}
+    for col in NUMERIC_COLUMNS:
+        columns[col] = df[col].to_numpy(dtype=np.int64 if col == 'max_devices' else np.float64)
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            columns[col] = df[col].astype(str).to_numpy(dtype=str)
+    return columns
+
+def row_hashes(columns):
+    """64-bit hash of every catalog row over its numeric and text columns"""
+    frame = pd.DataFrame({
+        col: np.asarray(columns[col]).astype(str)
+        for col in NUMERIC_COLUMNS + TEXT_COLUMNS if col in columns
+    })
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+def build_catalog(df, encoders):
+    """Turn the cleaned catalog DataFrame into named NumPy columns.
+
+    ``encoders`` maps each categorical column to a FrozenEncoder. Encryption
+    defaults are applied first so the stored codes match what the
+    recommender would compute from the CSV.
+    """
+    df = clean_catalog(df)
+    columns = source_columns(df)
+    for col in ENCODED_COLUMNS:
+        if col in df.columns:
+            columns[f'{col}_encoded'] = encoders[col].encode_array(df[col])
+    if 'country' in df.columns:
+        # Canonical country ids for matching and precomputed display names
+        columns['country_id'] = country_ids(columns['country'])
+        columns['country_display'] = display_names(columns['country'])
+    return columns
+
+def save_catalog(columns, model_dir=MODEL_DIR, source_path=None):
+    """Write one .npy per column plus a manifest into <model_dir>/catalog"""
+    manifest = {
+        'version': CATALOG_VERSION,
+        'rows': int(len(next(iter(columns.values())))) if columns else 0,
+        'columns': {name: values.dtype.str for name, values in columns.items()},
+        'source_sha256': file_checksum(source_path) if source_path else None
+    }
+    return save_artifact_dir(os.path.join(model_dir, CATALOG_DIRNAME), columns, manifest)
+
+def load_catalog(model_dir=MODEL_DIR, source_path=None, mmap_mode='r'):
+    """Load the catalog columns, or None if the artifact is missing or stale"""
+    path = os.path.join(model_dir, CATALOG_DIRNAME)
+    manifest = read_artifact_manifest(path, CATALOG_VERSION, 'catalog')
+    if manifest is None:
+        return None
+    if source_path and manifest.get('source_sha256') and os.path.exists(source_path):
+        if file_checksum(source_path) != manifest['source_sha256']:
+            logger.warning(f"Catalog artifact is older than {source_path}, rebuilding from CSV")
+            return None
+
+    return {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in manifest['columns']
+    }
+
+def patch_catalog(df, encoders, model_dir=MODEL_DIR, source_path=None):
+    """Bring the catalog artifact in line with ``df``, rebuilding only changed rows.
+
+    Rows are matched on ``row_hashes``; unchanged rows are copied from the
+    existing artifact, so ``encoders`` must only ever have been extended
+    (see ``extend_label_encoder``). Falls back to a full build when there
+    is no usable artifact. Returns the number of rows rebuilt.
+    """
+    old = load_catalog(model_dir)
+    new_source = source_columns(clean_catalog(df))
+    if old is None or any(col not in old for col in new_source):
+        save_catalog(build_catalog(df, encoders), model_dir, source_path)
+        return len(df)
+
+    # Position of every new row in the old artifact, -1 if new or changed
+    old_hashes = pd.Index(row_hashes(old))
+    unique = ~old_hashes.duplicated()
+    lookup = old_hashes[unique].get_indexer(row_hashes(new_source))
+    lookup = np.where(lookup >= 0, np.flatnonzero(unique)[lookup], -1)
+
+    changed = np.flatnonzero(lookup < 0)
+    patch = build_catalog(df.iloc[changed], encoders)
+    if set(patch) != set(old):
+        save_catalog(build_catalog(df, encoders), model_dir, source_path)
+        return len(df)
+
+    take = lookup.copy()
+    take[changed] = len(old_hashes) + np.arange(len(changed))
+    columns = {name: np.concatenate([old[name], patch[name]])[take] for name in patch}
+    save_catalog(columns, model_dir, source_path)
+    return len(changed)
@@ -0,0 +1,93 @@
+"""Country normalization shared by the catalog, the recommender and data cleaning.
+
+Catalog values come from a geocoder and are in the local language
+("Schweiz/Suisse/Svizzera/Svizra", "中国"), while users type English names
+or abbreviations ("Switzerland", "USA"). Both are mapped to one canonical
+code so country affinity is a plain integer comparison.
+"""
+import numpy as np
+
+# (code, display name, geocoded catalog name, other aliases)
+COUNTRIES = [
+    ('AE', 'UAE', 'الإمارات العربية المتحدة', ['UAE', 'United Arab Emirates', 'Emirates']),
+    ('AU', 'Australia', 'Australia', []),
+    ('BA', 'Bosnia', 'Bosna i Hercegovina / Босна и Херцеговина', ['Bosnia', 'Bosnia and Herzegovina', 'Bosna i Hercegovina']),
+    ('BB', 'Barbados', 'Barbados', []),
+    ('BG', 'Bulgaria', 'България', ['Bulgaria']),
+    ('BZ', 'Belize', 'Belize', []),
+    ('CA', 'Canada', 'Canada', []),
+    ('CH', 'Switzerland', 'Schweiz/Suisse/Svizzera/Svizra', ['Switzerland', 'Schweiz', 'Suisse', 'Svizzera', 'Svizra']),
+    ('CY', 'Cyprus', 'Κύπρος - Kıbrıs', ['Cyprus', 'Northern Cyprus', 'Κύπρος', 'Kıbrıs']),
+    ('CZ', 'Czech Republic', 'Česko', ['Czech Republic', 'Czechia']),
+    ('DE', 'Germany', 'Deutschland', ['Germany']),
+    ('DK', 'Denmark', 'Danmark', ['Denmark']),
+    ('FI', 'Finland', 'Suomi / Finland', ['Finland', 'Suomi']),
+    ('FR', 'France', 'France', []),
+    ('GB', 'UK', 'United Kingdom', ['UK', 'U.K.', 'Great Britain', 'Britain', 'England', 'GB']),
+    ('GI', 'Gibraltar', 'Gibraltar', []),
+    ('HK', 'Hong Kong', '中国', ['Hong Kong', '香港']),
+    ('HU', 'Hungary', 'Magyarország', ['Hungary']),
+    ('IE', 'Ireland', 'Éire / Ireland', ['Ireland', 'Éire']),
+    ('IL', 'Israel', 'ישראל', ['Israel']),
+    ('IN', 'India', 'India', []),
+    ('IO', 'British Indian Ocean', 'British Indian Ocean Territory', ['British Indian Ocean']),
+    ('IS', 'Iceland', 'Ísland', ['Iceland']),
+    ('IT', 'Italy', 'Italia', ['Italy']),
+    ('JP', 'Japan', '日本', ['Japan']),
+    ('MA', 'Morocco', 'Maroc ⵍⵎⵖⵔⵉⴱ المغرب', ['Morocco', 'Maroc']),
+    ('MD', 'Moldova', 'Moldova', []),
+    ('MT', 'Malta', 'Malta', []),
+    ('MU', 'Mauritius', 'Mauritius / Maurice', ['Mauritius', 'Maurice']),
+    ('MY', 'Malaysia', 'Malaysia مليسيا', ['Malaysia']),
+    ('NL', 'Netherlands', 'Nederland', ['Netherlands', 'Holland', 'The Netherlands']),
+    ('NO', 'Norway', 'Norge', ['Norway']),
+    ('PA', 'Panama', 'Panamá', ['Panama']),
+    ('PL', 'Poland', 'Polska', ['Poland']),
+    ('RO', 'Romania', 'România', ['Romania']),
+    ('SC', 'Seychelles', 'Sesel', ['Seychelles']),
+    ('SE', 'Sweden', 'Sverige', ['Sweden']),
+    ('SG', 'Singapore', 'Singapore', []),
+    ('SK', 'Slovakia', 'Slovensko', ['Slovakia']),
+    ('TW', 'Taiwan', '臺灣', ['Taiwan']),
+    ('US', 'USA', 'United States', ['USA', 'US', 'U.S.', 'U.S.A.', 'United States of America', 'America']),
+    ('VG', 'British Virgin Islands', 'British Virgin Islands', ['BVI']),
+]
+
+# Integer ids used in the catalog; 0 means the country is not in the table
+UNKNOWN_COUNTRY_ID = 0
+COUNTRY_IDS = {code: i + 1 for i, (code, _, _, _) in enumerate(COUNTRIES)}
+DISPLAY_NAMES = {code: display for code, display, _, _ in COUNTRIES}
+GEOCODED_NAMES = {code: geocoded for code, _, geocoded, _ in COUNTRIES}
+
+def _alias_key(value):
+    return ' '.join(str(value).split()).casefold()
+
+ALIASES = {}
+for _code, _display, _geocoded, _aliases in COUNTRIES:
+    for _alias in [_display, _geocoded] + _aliases:
+        ALIASES.setdefault(_alias_key(_alias), _code)
+
+def country_code(value):
+    """Canonical code for a catalog value or user input, or None if unknown"""
+    if value is None:
+        return None
+    return ALIASES.get(_alias_key(value))
+
+def country_id(value):
+    code = country_code(value)
+    return COUNTRY_IDS[code] if code else UNKNOWN_COUNTRY_ID
+
+def display_name(value):
+    """Display name for a raw country value, falling back to the value itself"""
+    code = country_code(value)
+    return DISPLAY_NAMES[code] if code else value
+
+def country_ids(values):
+    """Vectorized ``country_id`` over a column; each distinct value is resolved once"""
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return np.array([country_id(v) for v in uniques], dtype=np.int32)[inverse.reshape(-1)]
+
+def display_names(values):
+    """Vectorized ``display_name`` over a column"""
+    uniques, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return np.array([display_name(v) for v in uniques], dtype=str)[inverse.reshape(-1)]
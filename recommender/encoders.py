@@ -0,0 +1,74 @@
+import os
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+from joblib import load
+
+UNKNOWN = 'Unknown'
+
+class FrozenEncoder:
+    """Read-only category -> code map compiled from a fitted LabelEncoder.
+
+    Values outside the fitted classes map to the code of 'Unknown', or to 0
+    when the encoder never saw 'Unknown'. This matches the fallback the
+    recommender has always applied around ``LabelEncoder.transform``.
+    """
+
+    __slots__ = ('classes', 'codes', 'unknown_code')
+
+    def __init__(self, classes):
+        self.classes = tuple(classes)
+        self.codes = MappingProxyType({value: code for code, value in enumerate(self.classes)})
+        self.unknown_code = self.codes.get(UNKNOWN, 0)
+
+    @classmethod
+    def from_label_encoder(cls, encoder):
+        return cls(encoder.classes_.tolist())
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __contains__(self, value):
+        try:
+            return value in self.codes
+        except TypeError:
+            return False
+
+    def encode(self, value):
+        """Code of a single value"""
+        try:
+            return self.codes.get(value, self.unknown_code)
+        except TypeError:  # unhashable input
+            return self.unknown_code
+
+    def encode_array(self, values):
+        """Codes of a whole column; each distinct value is looked up once"""
+        positions, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=False)
+        table = np.fromiter((self.encode(value) for value in uniques), dtype=np.int64, count=len(uniques))
+        return table[positions]
+
+def extend_label_encoder(encoder, values):
+    """Append the unseen ``values`` to a fitted LabelEncoder, in sorted order.
+
+    Existing classes keep their codes, so the model and any catalog encoded
+    with the old encoder stay valid. Returns the added classes.
+    """
+    known = set(encoder.classes_.tolist())
+    added = sorted({value for value in pd.unique(np.asarray(values, dtype=object)) if value not in known})
+    if added:
+        encoder.classes_ = np.concatenate([encoder.classes_.astype(object), np.array(added, dtype=object)])
+    return added
+
+def load_encoder(path):
+    """Load an enc_<col>.pkl LabelEncoder and compile it"""
+    return FrozenEncoder.from_label_encoder(load(path))
+
+def load_encoders(columns, model_dir):
+    """Compile every enc_<col>.pkl, falling back to an 'Unknown'-only encoder"""
+    encoders = {}
+    for col in columns:
+        try:
+            encoders[col] = load_encoder(os.path.join(model_dir, f'enc_{col}.pkl'))
+        except Exception:
+            encoders[col] = FrozenEncoder([UNKNOWN])
+    return encoders
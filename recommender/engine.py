@@ -0,0 +1,420 @@
+import os
+import uuid
+import hashlib
+import logging
+import time
+import threading
+import numpy as np
+import pandas as pd
+from joblib import load
+
+from recommender.catalog import (
+    CATALOG_DIRNAME, DATA_PATH, ENCODED_COLUMNS, MODEL_DIR,
+    build_catalog, file_checksum, load_catalog
+)
+from recommender.bundle import BundleError, is_published, read_manifest, resolve_model_dir
+from recommender.countries import UNKNOWN_COUNTRY_ID, country_id
+from recommender.encoders import load_encoders as compile_encoders
+from recommender.forest import load_forest
+from recommender.index import FilterIndex, argtop_k
+from recommender.metrics import SCORING_ERRORS, UNKNOWN_ENCODINGS, stage
+from recommender.score_table import load_score_table
+from recommender.similar import SimilarityIndex
+from recommender.preferences import LEARNER_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Feature order must match training
+FEATURE_ORDER = [
+    'speed', 'price', 'max_devices', 'trial_available',
+    'country_encoded', 'logging_policy_encoded',
+    'encryption_encoded', 'default_encryption_encoded',
+    'strongest_encryption_encoded', 'handshake_encryption_encoded'
+]
+
+# Model features taken from the user rather than the catalog row
+USER_FEATURES = ['trial_available', 'country_encoded', 'logging_policy_encoded']
+
+RESULT_COLUMNS = [
+    'name', 'country', 'price', 'speed', 'base_score',
+    'logging_policy', 'encryption', 'max_devices',
+    'trial_available', 'personalized_score', 'country_display'
+]
+
+SIMILAR_COLUMNS = [
+    'name', 'country', 'price', 'speed', 'logging_policy', 'encryption',
+    'max_devices', 'trial_available', 'country_display'
+]
+
+# Up to this many rows the flattened forest beats sklearn's per-call
+# overhead; larger matrices go through the compiled sklearn trees. Both
+# give identical scores. The crossover depends on the machine and the
+# forest; benchmarks/bench_recommender.py measures it.
+FOREST_MAX_ROWS = int(os.getenv('VPN_FOREST_MAX_ROWS', 1024))
+
+# Per-stage latency histograms
+ARTIFACT_LOAD = stage('artifact_load')
+ENCODING = stage('encoding')
+FILTERING = stage('filtering')
+SCORING = stage('scoring')
+COUNTRY_MATCH = stage('country_match')
+TOP_K = stage('top_k')
+
+# Rows per chunk for out-of-core scoring (recommender.streaming); 0 keeps
+# the whole catalog in memory
+STREAM_CHUNK_ROWS = int(os.getenv('VPN_STREAM_CHUNK_ROWS', 0))
+
+# Preference weights of an untrained learner: personalization adds nothing
+DEFAULT_WEIGHTS = np.zeros(len(LEARNER_FEATURES))
+# Most points the learned price and speed preferences can add or take away
+PREFERENCE_POINTS = 20
+
+def load_encoders(model_dir=MODEL_DIR):
+    """Load the enc_<col>.pkl label encoders as O(1) lookup tables"""
+    return compile_encoders(ENCODED_COLUMNS, model_dir)
+
+def artifact_version(paths):
+    """Short content hash identifying a set of artifact files"""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            digest.update(os.path.basename(path).encode())
+            digest.update(file_checksum(path).encode())
+    return digest.hexdigest()[:16]
+
+class RecommendationEngine:
+    """Scores the VPN catalog against user preferences.
+
+    The model, encoders and pre-encoded catalog columns are loaded once and
+    kept in memory, so ``recommend`` only does per-request scoring.
+    """
+
+    def __init__(self, model, encoders, catalog, version=None, forest=None, score_table=None):
+        self._init_artifacts(model, encoders, catalog, version, forest, score_table)
+        self._country_lower = np.char.lower(np.asarray(catalog.get('country', []), dtype=str))
+
+        # Per-VPN feature columns are fixed; the user columns are filled per request
+        self._features = np.zeros((self.size, len(FEATURE_ORDER)))
+        for i, col in enumerate(FEATURE_ORDER):
+            if col not in USER_FEATURES and self.size:
+                self._features[:, i] = catalog[col]
+
+        self.index = FilterIndex(catalog.get('logging_policy', []), catalog.get('max_devices', []))
+        self._similarity = SimilarityIndex(catalog) if self.size else None
+
+    def _init_artifacts(self, model, encoders, catalog, version, forest, score_table):
+        """Set the fields every engine has, whatever it precomputes from the catalog"""
+        self.model = model
+        self.forest = forest
+        # Optional precomputed base scores; model inference is skipped when present
+        self.score_table = score_table
+        # Identifies the loaded artifacts, e.g. for cache keys
+        self.version = version or uuid.uuid4().hex[:16]
+        self.encoders = encoders
+        self.catalog = catalog
+        self.size = len(catalog['name']) if 'name' in catalog else 0
+        self._country_ids = np.asarray(catalog.get('country_id', np.zeros(self.size, dtype=np.int32)))
+        # Name -> first catalog position, built on first use
+        self._positions = None
+
+    @classmethod
+    def from_frame(cls, model, encoders, df, version=None, forest=None):
+        """Build an engine from a cleaned catalog DataFrame"""
+        return cls(model, encoders, build_catalog(df, encoders), version=version, forest=forest)
+
+    @classmethod
+    def load(cls, model_dir=None, data_path=DATA_PATH):
+        """Load the model, encoders and catalog from disk.
+
+        Without ``model_dir`` the current published bundle is used, falling
+        back to ``models/``. The precompiled catalog artifact is used when
+        present; outside a published bundle a missing or stale artifact is
+        rebuilt from the CSV.
+        """
+        start = time.perf_counter()
+        if model_dir is None:
+            model_dir = resolve_model_dir()
+            if model_dir != MODEL_DIR:
+                data_path = None  # published bundles are self-contained
+
+        if is_published(model_dir):
+            # Published bundles must match their manifest exactly
+            manifest = read_manifest(model_dir)
+        else:
+            # The working directory may be mid-training or edited by hand;
+            # fall back to versioning the files as they are
+            try:
+                manifest = read_manifest(model_dir)
+            except BundleError as e:
+                logger.warning(f"{e}; versioning the artifacts by their checksums instead")
+                manifest = None
+        model_path = os.path.join(model_dir, 'model.pkl')
+        model = load(model_path)
+        forest = load_forest(model_dir, model_path)
+        encoders = load_encoders(model_dir)
+        catalog = load_catalog(model_dir, source_path=data_path)
+        artifacts = [os.path.join(model_dir, 'model.pkl')]
+        artifacts += [os.path.join(model_dir, f'enc_{col}.pkl') for col in ENCODED_COLUMNS]
+        if catalog is None:
+            if data_path is None:
+                raise BundleError(f"No usable catalog artifact in {model_dir}")
+            version = artifact_version(artifacts + [data_path])
+            engine = cls.from_frame(model, encoders, pd.read_csv(data_path), version=version, forest=forest)
+        else:
+            if manifest:
+                version = manifest['version']
+            else:
+                version = artifact_version(artifacts + [os.path.join(model_dir, CATALOG_DIRNAME, 'manifest.json')])
+            score_table = load_score_table(model_dir, encoders, len(catalog['name']))
+            engine = cls(model, encoders, catalog, version=version, forest=forest, score_table=score_table)
+        ARTIFACT_LOAD.observe(time.perf_counter() - start)
+        logger.info(f"Loaded {engine.size} VPNs for recommendation (version {engine.version})")
+        return engine
+
+    def frame(self):
+        """The catalog as a DataFrame, for offline tooling"""
+        return pd.DataFrame({name: np.asarray(values) for name, values in self.catalog.items()})
+
+    def _position(self, name):
+        """Catalog position of the first VPN called ``name``, or None"""
+        if self._positions is None:
+            names = np.asarray(self.catalog.get('name', [])).tolist()
+            self._positions = {value: i for i, value in reversed(list(enumerate(names)))}
+        return self._positions.get(name)
+
+    def preference_features(self, name):
+        """Preference learner features of a catalog VPN, or None if unknown"""
+        position = self._position(name)
+        if position is None:
+            return None
+        return [
+            float(self.catalog['price'][position]),
+            float(self.catalog['speed'][position]),
+            float(self.catalog['logging_policy_encoded'][position]),
+            1.0 if str(self.catalog['trial_available'][position]).lower() == 'yes' else 0.0
+        ]
+
+    def _similarity_index(self):
+        return self._similarity
+
+    def similar(self, name, top_k=5, max_price=None, logging_policy=None, min_devices=None):
+        """Records of the VPNs nearest to ``name`` that pass the optional filters, closest first.
+
+        Returns None if ``name`` is not in the catalog.
+        """
+        position = self._position(name)
+        if position is None:
+            return None
+        rows, distances = self._similarity_index().query(
+            position, top_k, max_price=max_price, logging_policy=logging_policy, min_devices=min_devices
+        )
+        # Plain records: building a DataFrame would cost more than the query
+        columns = {'vpn_name' if col == 'name' else col: self.catalog[col][rows].tolist() for col in SIMILAR_COLUMNS}
+        columns['distance'] = distances.tolist()
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def _user_features(self, inputs):
+        """Process user inputs with defaults"""
+        user_features = {
+            'speed': float(inputs.get('speed', 5)),
+            'price': float(inputs.get('price', 10)),
+            'trial_available': 1 if str(inputs.get('trial_available', 'no')).lower() == 'yes' else 0,
+            'max_devices': int(inputs.get('max_devices', 1)),
+            'encryption': inputs.get('encryption', 'AES-256'),
+            'logging_policy': inputs.get('logging_policy', 'no_logs'),
+            'country': inputs.get('country', '').strip(),
+            'default_encryption': inputs.get('default_encryption', 'AES-256'),
+            'strongest_encryption': inputs.get('strongest_encryption', 'AES-256'),
+            'handshake_encryption': inputs.get('handshake_encryption', 'RSA-4096')
+        }
+        for feature in ENCODED_COLUMNS:
+            value = user_features.get(feature, 'Unknown')
+            encoder = self.encoders[feature]
+            if value not in encoder:
+                UNKNOWN_ENCODINGS.inc(feature)
+            user_features[f'{feature}_encoded'] = encoder.encode(value)
+        return user_features
+
+    def _country_match(self, country, positions):
+        # Enhanced country handling - don't filter, just score
+        if not country:
+            return np.full(len(positions), 0.5)  # neutral score when no country specified
+        user_country = country_id(country)
+        if user_country != UNKNOWN_COUNTRY_ID:
+            return np.where(self._country_ids[positions] == user_country, 1.0, 0.3)
+
+        # Countries outside the alias table fall back to text matching
+        country = country.lower()
+        names = self._lower_countries(positions)
+        return np.where(names == country, 1.0, np.where(np.char.find(names, country) >= 0, 0.7, 0.3))
+
+    def _lower_countries(self, positions):
+        return self._country_lower[positions]
+
+    def score(self, user_features, positions=None, use_table=True):
+        """Model score (0-100) of the given catalog rows in one predict_proba call"""
+        if use_table and self.score_table is not None:
+            scores = self.score_table.lookup(user_features, positions)
+            if scores is not None:
+                return scores
+        return self._predict(self._feature_matrix(user_features, positions))
+
+    def _feature_matrix(self, user_features, positions=None):
+        """Model input rows of ``positions`` (all rows by default) with the user columns filled in"""
+        X = self._features.copy() if positions is None else self._features[positions]
+        for feature in USER_FEATURES:
+            X[:, FEATURE_ORDER.index(feature)] = user_features[feature]
+        return X
+
+    def scoring_path(self, user_features, rows):
+        """Scorer used for ``rows`` candidates of a profile: 'score_table', 'forest' or 'sklearn'"""
+        if self.score_table is not None and self.score_table.row(user_features) is not None:
+            return 'score_table'
+        return 'forest' if self._use_forest(rows) else 'sklearn'
+
+    def _use_forest(self, rows):
+        return self.forest is not None and rows <= FOREST_MAX_ROWS
+
+    def _predict(self, X):
+        try:
+            if self._use_forest(len(X)):
+                return self.forest.predict_proba(X) * 100
+            return self.model.predict_proba(pd.DataFrame(X, columns=FEATURE_ORDER))[:, 1] * 100
+        except Exception as e:
+            SCORING_ERRORS.inc()
+            logger.error(f"Error calculating score: {e}")
+            return np.zeros(len(X))
+
+    def _candidates(self, user_features, inputs):
+        """Apply strict filters if specified, before any scoring"""
+        return self.index.candidates(
+            logging_policy='no_logs' if user_features['logging_policy'] == 'no_logs' else None,
+            min_devices=user_features['max_devices'] if 'max_devices' in inputs else None
+        )
+
+    def _personalize(self, user_features, candidates, base_score, weights):
+        """Apply personalized weights with country consideration"""
+        with COUNTRY_MATCH.time():
+            country_match = self._country_match(user_features['country'], candidates)
+        return self._combine(user_features, candidates, base_score, country_match, weights)
+
+    def _combine(self, user_features, candidates, base_score, country_match, weights):
+        # Price gap and speed are clipped to [0, 1] and learned weights sum to
+        # at most 1, so preferences move a score by at most PREFERENCE_POINTS
+        price_gap = np.minimum(np.abs(self.catalog['price'][candidates] - user_features['price']) / 20, 1.0)
+        speed = np.clip(self.catalog['speed'][candidates] / 10, 0.0, 1.0)
+        return (
+            base_score * 0.6 +  # base model score
+            country_match * 30 +  # country importance (0-30 points)
+            (1 - price_gap * weights[0] * PREFERENCE_POINTS +
+            speed * weights[1] * PREFERENCE_POINTS
+        ))
+
+    def recommend(self, inputs, top_k=5, weights=None):
+        """Return the top VPNs for the given user inputs"""
+        return self.recommend_batch([inputs], top_k, weights)[0]
+
+    def recommend_batch(self, profiles, top_k=5, weights=None):
+        """Return the top VPNs for each profile, scoring them all in one model call.
+
+        The eligible rows of every profile are stacked into a single feature
+        matrix, so the forest is traversed once per batch rather than once
+        per profile. ``weights`` are the preference learner's weights,
+        ``DEFAULT_WEIGHTS`` when not given.
+        """
+        if self.size == 0:
+            return [pd.DataFrame(columns=['vpn_name', 'country', 'score']) for _ in profiles]
+
+        with ENCODING.time():
+            user_features = [self._user_features(inputs) for inputs in profiles]
+        with FILTERING.time():
+            candidates = [self._candidates(features, inputs) for features, inputs in zip(user_features, profiles)]
+        with SCORING.time():
+            base_scores = self._base_scores(user_features, candidates)
+
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        results = []
+        for features, rows, base_score in zip(user_features, candidates, base_scores):
+            personalized_score = self._personalize(features, rows, base_score, weights)
+            with TOP_K.time():
+                best = argtop_k(personalized_score, top_k)
+                results.append(self._results(rows[best], base_score[best], personalized_score[best]))
+        return results
+
+    def _base_scores(self, user_features, candidates):
+        """Model scores of every profile's candidates.
+
+        Profiles covered by the score table are looked up; the rest are
+        stacked into one feature matrix and scored in a single model call.
+        """
+        scores = [None] * len(candidates)
+        if self.score_table is not None:
+            scores = [self.score_table.lookup(f, rows) for f, rows in zip(user_features, candidates)]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if not missing:
+            return scores
+
+        counts = [len(candidates[i]) for i in missing]
+        X = self._features[np.concatenate([candidates[i] for i in missing])]
+        for feature in USER_FEATURES:
+            X[:, FEATURE_ORDER.index(feature)] = np.repeat([user_features[i][feature] for i in missing], counts)
+        predicted = np.split(self._predict(X) if len(X) else np.empty(0), np.cumsum(counts)[:-1])
+        for i, base_score in zip(missing, predicted):
+            scores[i] = base_score
+        return scores
+
+    def _results(self, top, base_score, personalized_score):
+        """Result rows for the given catalog positions and their scores"""
+        scores = {'base_score': base_score, 'personalized_score': personalized_score}
+        results = pd.DataFrame(
+            {col: scores[col] if col in scores else np.asarray(self.catalog[col])[top] for col in RESULT_COLUMNS},
+            index=top
+        )
+        return results.rename(columns={
+            'name': 'vpn_name',
+            'base_score': 'score'
+        })
+
+class EngineHolder:
+    """Holds the live engine and swaps in reloaded ones atomically.
+
+    Callers fetch the engine once per request and use that reference
+    throughout, so a reload never mixes artifact versions within a
+    response; in-flight requests simply finish on the old engine.
+    """
+
+    def __init__(self, loader=RecommendationEngine.load):
+        self._loader = loader
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._loader()
+        return self._engine
+
+    def reload(self):
+        """Load a fresh engine and swap it in; returns (old, new)"""
+        with self._lock:
+            engine = self._loader()
+            old, self._engine = self._engine, engine
+        return old, engine
+
+def load_engine():
+    """Load the engine type selected by VPN_STREAM_CHUNK_ROWS"""
+    if STREAM_CHUNK_ROWS > 0:
+        from recommender.streaming import StreamingEngine
+        return StreamingEngine.load()
+    return RecommendationEngine.load()
+
+engine_holder = EngineHolder(loader=load_engine)
+
+def get_engine():
+    """Return the process-wide engine, loading it on first use"""
+    return engine_holder.get()
+
+def reload_engine():
+    """Reload the artifacts and swap the process-wide engine"""
+    return engine_holder.reload()
@@ -0,0 +1,146 @@
+"""Flattened RandomForest for fast, shareable inference.
+
+The trees of a fitted ``RandomForestClassifier`` are concatenated into a
+handful of contiguous node arrays stored under ``<model_dir>/forest/``.
+They are loaded with ``np.load(mmap_mode='r')`` so worker processes share
+the same pages, and evaluated for a whole candidate matrix at once: every
+tree advances one level per step for all rows together.
+
+Evaluation mirrors sklearn exactly: inputs are cast to float32 like sklearn
+does, thresholds are rounded down to float32 (which keeps every split
+decision identical), leaf class counts are normalized the same way and the
+per-tree probabilities are summed in tree order before averaging.
+"""
+import os
+import logging
+import numpy as np
+
+from recommender.catalog import file_checksum, read_artifact_manifest, save_artifact_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout changes
+FOREST_VERSION = 1
+FOREST_DIRNAME = 'forest'
+FOREST_ARRAYS = ['feature', 'threshold', 'children', 'leaf_value', 'roots', 'depths']
+
+def _float32_floor(values):
+    """Largest float32 <= each float64 value.
+
+    For a float32 ``x``, ``x <= t`` holds exactly when ``x <= _float32_floor(t)``,
+    so comparisons can stay in float32 without changing any split.
+    """
+    rounded = values.astype(np.float32)
+    too_big = rounded.astype(np.float64) > values
+    rounded[too_big] = np.nextafter(rounded[too_big], np.float32(-np.inf))
+    return rounded
+
+class FlatForest:
+    """Vectorized evaluator over flattened forest node arrays.
+
+    ``children[2 * node]`` is the left child of ``node`` and
+    ``children[2 * node + 1]`` the right one. Leaves point to themselves, so
+    rows that reach a leaf early simply stay put. Trees are walked deepest
+    first, and each step only touches the trees that are still deep enough.
+    """
+
+    def __init__(self, feature, threshold, children, leaf_value, roots, depths):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.depths = depths
+        # Deepest trees first; after step i only the first _active[i] still move
+        self._order = np.argsort(-np.asarray(depths), kind='stable')
+        self._unsort = np.argsort(self._order)
+        self._active = [int((np.asarray(depths) > i).sum()) for i in range(self.max_depth)]
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted binary RandomForestClassifier"""
+        if model.n_outputs_ != 1 or len(model.classes_) != 2:
+            raise ValueError("Only single-output binary forests can be flattened")
+        arrays = {name: [] for name in FOREST_ARRAYS[:-2]}
+        roots = []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            arrays['feature'].append(np.where(is_leaf, 0, tree.feature))
+            arrays['threshold'].append(np.where(is_leaf, 0.0, tree.threshold))
+            left = np.where(is_leaf, nodes, tree.children_left) + offset
+            right = np.where(is_leaf, nodes, tree.children_right) + offset
+            arrays['children'].append(np.column_stack([left, right]).ravel())
+            arrays['leaf_value'].append(value[:, 1] / normalizer)
+            roots.append(offset)
+            offset += tree.node_count
+        return cls(
+            feature=np.concatenate(arrays['feature']).astype(np.intp),
+            threshold=_float32_floor(np.concatenate(arrays['threshold'])),
+            children=np.concatenate(arrays['children']).astype(np.intp),
+            leaf_value=np.concatenate(arrays['leaf_value']).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            depths=np.asarray([estimator.tree_.max_depth for estimator in model.estimators_], dtype=np.intp)
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def max_depth(self):
+        return int(max(self.depths, default=0))
+
+    def predict_proba(self, X, chunk_size=512):
+        """Probability of the positive class for every row of ``X``"""
+        # sklearn rounds inputs to float32 too; thresholds are stored to match
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X))
+        for start in range(0, len(X), chunk_size):
+            out[start:start + chunk_size] = self._predict_chunk(X[start:start + chunk_size])
+        return out
+
+    def _predict_chunk(self, X):
+        offsets = np.arange(len(X)) * X.shape[1]
+        values = X.ravel()
+        node = np.repeat(self.roots[self._order, None], len(X), axis=1)
+        for active in self._active:
+            live = node[:active]
+            go_right = values.take(offsets + self.feature.take(live)) > self.threshold.take(live)
+            live[...] = self.children.take(2 * live + go_right)
+        # Back to (trees, rows) in model order so the sum matches sklearn's
+        return self.leaf_value.take(node)[self._unsort].sum(axis=0) / self.n_trees
+
+def export_forest(model, model_dir, model_path=None):
+    """Write the flattened forest to <model_dir>/forest, swapped in atomically"""
+    forest = FlatForest.from_sklearn(model)
+    manifest = {
+        'version': FOREST_VERSION,
+        'trees': forest.n_trees,
+        'nodes': int(len(forest.feature)),
+        'max_depth': forest.max_depth,
+        'n_features': int(model.n_features_in_),
+        'model_sha256': file_checksum(model_path) if model_path else None
+    }
+    arrays = {name: getattr(forest, name) for name in FOREST_ARRAYS}
+    return save_artifact_dir(os.path.join(model_dir, FOREST_DIRNAME), arrays, manifest)
+
+def load_forest(model_dir, model_path=None, mmap_mode='r'):
+    """Load the flattened forest, or None if it is missing or older than ``model_path``"""
+    path = os.path.join(model_dir, FOREST_DIRNAME)
+    manifest = read_artifact_manifest(path, FOREST_VERSION, 'forest')
+    if manifest is None:
+        return None
+    if model_path and manifest.get('model_sha256') and os.path.exists(model_path):
+        if file_checksum(model_path) != manifest['model_sha256']:
+            logger.warning(f"Forest artifact does not match {model_path}, using the sklearn model")
+            return None
+
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in FOREST_ARRAYS}
+    return FlatForest(**arrays)
@@ -0,0 +1,53 @@
+import numpy as np
+
+class FilterIndex:
+    """Lookup of the catalog rows that pass the hard filters.
+
+    Rows are partitioned by logging policy and each partition is sorted by
+    ``max_devices``, so a ``max_devices >= n`` filter is one binary search
+    and a slice instead of a scan over the whole catalog.
+    """
+
+    def __init__(self, logging_policy, max_devices):
+        logging_policy = np.asarray(logging_policy)
+        max_devices = np.asarray(max_devices)
+        self._all = self._sorted_by_devices(np.arange(len(max_devices)), max_devices)
+        self._partitions = {
+            str(policy): self._sorted_by_devices(np.flatnonzero(logging_policy == policy), max_devices)
+            for policy in np.unique(logging_policy)
+        }
+
+    @staticmethod
+    def _sorted_by_devices(positions, max_devices):
+        order = positions[np.argsort(max_devices[positions], kind='stable')]
+        return max_devices[order], order
+
+    def candidates(self, logging_policy=None, min_devices=None):
+        """Catalog positions matching the filters, in ascending order"""
+        if logging_policy is None:
+            devices, order = self._all
+        elif logging_policy in self._partitions:
+            devices, order = self._partitions[logging_policy]
+        else:
+            return np.empty(0, dtype=np.int64)
+
+        start = 0 if min_devices is None else np.searchsorted(devices, min_devices, side='left')
+        return np.sort(order[start:])
+
+def argtop_k(scores, k):
+    """Positions of the ``k`` largest scores, best first.
+
+    Uses a partial selection rather than a full sort. Ties are broken by
+    position, matching ``DataFrame.nlargest(keep='first')``.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        selected = np.arange(n)
+    else:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        selected = np.concatenate([above, ties])
+    return selected[np.lexsort((selected, -scores[selected]))]
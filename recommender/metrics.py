@@ -0,0 +1,213 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Recording is cheap: a histogram observation is a bisect and two additions
+under a lock, and nothing is formatted until ``/metrics`` is scraped.
+Callback gauges (e.g. cache statistics) are only read at scrape time.
+Set VPN_METRICS=0 to turn stage timing into a no-op.
+
+With the process scoring pool, stages that run inside worker processes
+are recorded there and do not show up in the app's ``/metrics``.
+
+``collect_stages`` additionally gathers the stage durations of one request
+on the current thread, e.g. for the request log.
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+
+ENABLED = os.getenv('VPN_METRICS', '1') != '0'
+
+# Per-thread dict that stage timers also add their durations to
+_local = threading.local()
+
+# Seconds; tuned for sub-millisecond stages up to slow model calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _HistogramChild:
+    __slots__ = ('name', '_buckets', '_counts', '_sum', '_lock')
+
+    def __init__(self, name, buckets):
+        self.name = name
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return _Timer(self) if ENABLED else _NULL_TIMER
+
+    def record(self, seconds):
+        """Observe a stage duration measured by the caller, also for ``collect_stages``"""
+        self.observe(seconds)
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + seconds
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+class _Timer:
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.record(time.perf_counter() - self._start)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Child histogram for one label combination; keep a reference on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(','.join(map(str, values)), self.buckets))
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for values, child in sorted(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, values, [("le", le)])} {cumulative}')
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {repr(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Unlabeled counters are exported as 0 before the first increment
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}')
+        return lines
+
+class CallbackMetric:
+    """Counter or gauge whose samples are read from ``callback`` at scrape time.
+
+    ``callback`` returns a list of (label values, value) pairs.
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, value in self.callback():
+            if value is not None:
+                lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'vpn_stage_seconds', 'Time spent in each recommendation stage', ['stage']
+))
+UNKNOWN_ENCODINGS = registry.register(Counter(
+    'vpn_unknown_encoding_total', 'User inputs encoded with the Unknown fallback', ['column']
+))
+SCORING_ERRORS = registry.register(Counter(
+    'vpn_scoring_errors_total', 'Model scoring calls that raised and returned zero scores'
+))
+
+class collect_stages:
+    """Collect the stage durations (seconds) timed on this thread inside the block.
+
+        with collect_stages() as timings:
+            engine.recommend(inputs)
+    """
+
+    def __init__(self, timings=None):
+        self.timings = {} if timings is None else timings
+
+    def __enter__(self):
+        self._previous = getattr(_local, 'timings', None)
+        _local.timings = self.timings
+        return self.timings
+
+    def __exit__(self, *exc):
+        _local.timings = self._previous
+        return False
+
+def stage(name):
+    """Histogram child for one stage of ``vpn_stage_seconds``"""
+    return STAGE_SECONDS.labels(name)
@@ -0,0 +1,161 @@
+"""Parity checks: the engine against the original per-row pipeline, and
+the flattened forest against sklearn.
+
+The reference is the original ``recommend_vpn``: read the CSV, apply the
+encryption defaults, encode with the fitted LabelEncoders through
+``safe_encode`` and call ``predict_proba`` once per row. The tests in
+``tests/test_parity.py`` run a sample of it; the full sweep runs with
+``python -m recommender.parity`` from the project root.
+"""
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from joblib import load
+from sklearn.preprocessing import LabelEncoder
+
+from recommender.catalog import DATA_PATH, ENCODED_COLUMNS, ENCRYPTION_DEFAULTS, MODEL_DIR
+from recommender.engine import FEATURE_ORDER, RecommendationEngine
+
+def safe_encode(encoder, value):
+    """Encode one value with a LabelEncoder, falling back to 'Unknown', then 0"""
+    try:
+        if value in encoder.classes_:
+            return encoder.transform([value])[0]
+        return encoder.transform(['Unknown'])[0]
+    except Exception:
+        return 0
+
+def baseline_frame(model_dir=MODEL_DIR, data_path=DATA_PATH):
+    """The catalog CSV cleaned and encoded the original way, plus the LabelEncoders used"""
+    df = pd.read_csv(data_path)
+    for col, default in ENCRYPTION_DEFAULTS.items():
+        if col in df.columns:
+            df[col] = df[col].replace(['Unknown', 'nan', '', None], default).fillna(default)
+
+    encoders = {}
+    for col in ENCODED_COLUMNS:
+        try:
+            encoders[col] = load(os.path.join(model_dir, f'enc_{col}.pkl'))
+        except Exception:
+            encoders[col] = LabelEncoder().fit(['Unknown'])
+    for col in ENCODED_COLUMNS:
+        if col in df.columns:
+            df[f'{col}_encoded'] = df[col].apply(lambda x: safe_encode(encoders[col], x))
+    return df, encoders
+
+def baseline_user_features(inputs, encoders):
+    """User features of ``inputs`` encoded the original way"""
+    user_features = {
+        'speed': float(inputs.get('speed', 5)),
+        'price': float(inputs.get('price', 10)),
+        'trial_available': 1 if str(inputs.get('trial_available', 'no')).lower() == 'yes' else 0,
+        'max_devices': int(inputs.get('max_devices', 1)),
+        'encryption': inputs.get('encryption', 'AES-256'),
+        'logging_policy': inputs.get('logging_policy', 'no_logs'),
+        'country': inputs.get('country', '').strip(),
+        'default_encryption': inputs.get('default_encryption', 'AES-256'),
+        'strongest_encryption': inputs.get('strongest_encryption', 'AES-256'),
+        'handshake_encryption': inputs.get('handshake_encryption', 'RSA-4096')
+    }
+    for feature in ENCODED_COLUMNS:
+        user_features[f'{feature}_encoded'] = safe_encode(encoders[feature], user_features.get(feature, 'Unknown'))
+    return user_features
+
+def reference_scores(model, df, user_features):
+    """Score the catalog one row at a time, as recommend_vpn originally did"""
+    def calculate_score(row):
+        X = pd.DataFrame([[
+            row['speed'],
+            row['price'],
+            row['max_devices'],
+            user_features['trial_available'],
+            user_features['country_encoded'],
+            user_features['logging_policy_encoded'],
+            row['encryption_encoded'],
+            row['default_encryption_encoded'],
+            row['strongest_encryption_encoded'],
+            row['handshake_encryption_encoded']
+        ]], columns=FEATURE_ORDER)
+        return model.predict_proba(X)[0][1] * 100
+
+    return df.apply(calculate_score, axis=1).to_numpy()
+
+def baseline_recommend(model, df, encoders, inputs, top_k=5):
+    """Top VPNs for ``inputs`` through the original pipeline with untrained preference weights.
+
+    Country matching is the original text match (exact 1.0, substring 0.7,
+    otherwise 0.3). The alias table matches more names ("USA" now matches
+    "United States"), so only compare profiles whose country is spelled as
+    in the catalog, unknown, or empty.
+    """
+    user_features = baseline_user_features(inputs, encoders)
+    df = df.copy()
+    if user_features['country']:
+        country = user_features['country'].lower()
+        df['country_match'] = df['country'].str.lower().apply(
+            lambda x: 1.0 if x == country else 0.7 if country in x else 0.3
+        )
+    else:
+        df['country_match'] = 0.5
+    df['base_score'] = reference_scores(model, df, user_features)
+    # An untrained learner has zero weights, which leaves the constant 1
+    df['personalized_score'] = df['base_score'] * 0.6 + df['country_match'] * 30 + 1
+
+    if user_features['logging_policy'] == 'no_logs':
+        df = df[df['logging_policy'] == 'no_logs']
+    if 'max_devices' in inputs:
+        df = df[df['max_devices'] >= user_features['max_devices']]
+    return df.nlargest(top_k, 'personalized_score')
+
+def sample_profiles(engine):
+    """User inputs covering every value of the model's user-side features"""
+    countries = ['', 'Unknown', 'Nowhere'] + list(np.unique(engine.catalog['country']))
+    for trial, logging_policy, country in itertools.product(['yes', 'no'], ['no_logs', 'partial_logs'], countries):
+        yield {
+            'speed': 5, 'price': 5, 'max_devices': 1,
+            'trial_available': trial,
+            'logging_policy': logging_policy,
+            'encryption': 'AES-256',
+            'country': country
+        }
+
+def forest_parity(model, forest, X):
+    """Largest difference between the flattened forest and sklearn on ``X``"""
+    expected = model.predict_proba(pd.DataFrame(X, columns=FEATURE_ORDER))[:, 1]
+    return float(np.max(np.abs(forest.predict_proba(X) - expected), initial=0.0))
+
+def check_forest_parity(engine=None, atol=0.0):
+    """Compare the flattened forest with sklearn over every sample profile"""
+    engine = engine or RecommendationEngine.load()
+    if engine.forest is None:
+        raise AssertionError("No flattened forest artifact is loaded")
+    matrices = []
+    for inputs in sample_profiles(engine):
+        matrices.append(engine._feature_matrix(engine._user_features(inputs)))
+    diff = forest_parity(engine.model, engine.forest, np.concatenate(matrices))
+    if diff > atol:
+        raise AssertionError(f"Flattened forest differs from sklearn by {diff}")
+    return diff
+
+def check_parity(engine=None, profiles=None, atol=1e-9, model_dir=MODEL_DIR, data_path=DATA_PATH):
+    """Compare engine scores with the per-row scores of the original pipeline.
+
+    Returns the largest difference; raises if it exceeds ``atol``.
+    """
+    engine = engine or RecommendationEngine.load(model_dir, data_path=data_path)
+    df, encoders = baseline_frame(model_dir, data_path)
+    worst = 0.0
+    for inputs in profiles or sample_profiles(engine):
+        expected = reference_scores(engine.model, df, baseline_user_features(inputs, encoders))
+        diff = np.max(np.abs(engine.score(engine._user_features(inputs)) - expected))
+        worst = max(worst, float(diff))
+        if diff > atol:
+            raise AssertionError(f"Score mismatch of {diff} for inputs {inputs}")
+    return worst
+
+if __name__ == "__main__":
+    diff = check_forest_parity()
+    print(f"Flattened forest matches sklearn (max abs diff {diff:.3g})")
+    worst = check_parity()
+    print(f"Batched scores match the original per-row scores (max abs diff {worst:.3g})")
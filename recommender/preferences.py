@@ -0,0 +1,182 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from recommender.catalog import MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+LEARNER_FEATURES = ['price', 'speed', 'logging_policy', 'trial_available']
+
+# Weights as seen by the scorer; ``version`` increases with every update
+Weights = namedtuple('Weights', ['version', 'values'])
+
+class FeedbackQueueFull(Exception):
+    """The feedback queue is full; the rating was not recorded"""
+
+class PreferenceLearner:
+    def __init__(self):
+        self.model = SGDClassifier(loss='log_loss', warm_start=True)
+        self.features = list(LEARNER_FEATURES)
+        # Learn on standardized features so dollars and Mbps do not set the
+        # size of the coefficients
+        self.scaler = StandardScaler()
+        # Initialize with dummy data
+        dummy_X = [[0, 0, 0, 0]]
+        dummy_y = [0]
+        self.model.partial_fit(dummy_X, dummy_y, classes=[0, 1])
+
+    def update(self, user_feedback):
+        """Learn from user feedback"""
+        X = pd.DataFrame([user_feedback['features']])
+        self.update_batch(X, [user_feedback['rating']])
+
+    def update_batch(self, X, y):
+        """Learn from a mini-batch of feature rows and 0/1 ratings"""
+        X = np.asarray(X, dtype=float)
+        self.scaler.partial_fit(X)
+        self.model.partial_fit(self.scaler.transform(X), np.asarray(y))
+
+    def get_weights(self):
+        """Get feature weights: non-negative and summing to at most 1"""
+        weights = np.abs(self.model.coef_[0]) if hasattr(self.model, 'coef_') else np.ones(len(self.features))
+        total = weights.sum()
+        return weights / total if total > 1 else weights
+
+def _frozen(values):
+    values = np.array(values, dtype=float)
+    values.setflags(write=False)
+    return values
+
+class PreferenceService:
+    """Long-lived preference learner fed by user ratings.
+
+    ``submit`` only enqueues. A background thread drains the queue in
+    mini-batches of up to ``batch_size``, runs ``partial_fit`` and then
+    publishes a new immutable ``Weights``. The scorer reads ``weights``
+    without locking; rebinding the attribute is atomic, so a reader always
+    gets one complete snapshot. The learner is saved to ``snapshot_path``
+    every ``snapshot_interval`` seconds and on stop, and restored on start.
+    """
+
+    def __init__(self, snapshot_path=None, batch_size=32, max_queue=10000,
+                 flush_interval=1.0, snapshot_interval=60.0):
+        self.snapshot_path = snapshot_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.learner = PreferenceLearner()
+        self.weights = Weights(0, _frozen(self.learner.get_weights()))
+        self.processed = 0
+        self._saved_version = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            snapshot_path=os.getenv('VPN_PREFERENCES_PATH', os.path.join(MODEL_DIR, 'preferences.pkl')) or None,
+            batch_size=int(os.getenv('VPN_FEEDBACK_BATCH', 32)),
+            max_queue=int(os.getenv('VPN_FEEDBACK_QUEUE', 10000)),
+            snapshot_interval=float(os.getenv('VPN_PREFERENCES_SNAPSHOT_INTERVAL', 60))
+        )
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.restore()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='preference-learner', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker after it has learned from everything queued, then snapshot"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.snapshot()
+
+    def submit(self, features, rating):
+        """Queue one rating of a VPN with the given learner features"""
+        try:
+            self._queue.put_nowait((features, rating))
+        except queue.Full:
+            raise FeedbackQueueFull(f"{self._queue.qsize()} ratings already queued")
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._learn(batch)
+            if time.monotonic() - last_snapshot >= self.snapshot_interval:
+                self.snapshot()
+                last_snapshot = time.monotonic()
+
+    def _next_batch(self):
+        """Wait up to ``flush_interval`` for a rating, then take whatever else is queued"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _learn(self, batch):
+        X = [features for features, _ in batch]
+        y = [rating for _, rating in batch]
+        try:
+            self.learner.update_batch(X, y)
+        except Exception as e:
+            logger.error(f"Preference update failed, dropping {len(batch)} ratings: {str(e)}", exc_info=True)
+            return
+        self.processed += len(batch)
+        self.weights = Weights(self.weights.version + 1, _frozen(self.learner.get_weights()))
+
+    def snapshot(self):
+        """Write the learner to disk if it changed since the last snapshot"""
+        weights = self.weights
+        if not self.snapshot_path or weights.version == self._saved_version:
+            return
+        tmp = f'{self.snapshot_path}.tmp'
+        dump({'version': weights.version, 'model': self.learner.model, 'scaler': self.learner.scaler}, tmp)
+        os.replace(tmp, self.snapshot_path)
+        self._saved_version = weights.version
+        logger.info(f"Saved preference weights version {weights.version}")
+
+    def restore(self):
+        """Load the last snapshot, if any"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            state = load(self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable preference snapshot {self.snapshot_path}: {str(e)}")
+            return
+        if 'scaler' not in state:
+            # Learned on raw features, so its weights are not comparable
+            logger.warning(f"Ignoring preference snapshot {self.snapshot_path} from before feature scaling")
+            return
+        self.learner.model = state['model']
+        self.learner.scaler = state['scaler']
+        self.weights = Weights(state['version'], _frozen(self.learner.get_weights()))
+        self._saved_version = state['version']
+        logger.info(f"Restored preference weights version {state['version']}")
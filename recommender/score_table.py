@@ -0,0 +1,114 @@
+"""Precomputed base scores for the discrete part of the input space.
+
+The only model features taken from the user are ``trial_available`` (0/1),
+``country_encoded`` and ``logging_policy_encoded``, and the encoders map
+every input into a fixed range of codes. So the model score of every VPN
+can be computed offline for each combination and stored as a dense
+``(combinations, VPNs)`` table under ``<model_dir>/scores/``. Serving then
+replaces model inference with a row lookup.
+
+The table records the fingerprint of the catalog and the checksum of the
+model it was computed from, and is ignored when either has changed.
+"""
+import os
+import hashlib
+import logging
+import itertools
+import numpy as np
+
+from recommender.catalog import CATALOG_DIRNAME, file_checksum, read_artifact_manifest, save_artifact_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the on-disk layout changes
+SCORES_VERSION = 1
+SCORES_DIRNAME = 'scores'
+
+def catalog_fingerprint(model_dir):
+    """Hash over every file of the catalog artifact, or None if there is none"""
+    catalog_dir = os.path.join(model_dir, CATALOG_DIRNAME)
+    if not os.path.isdir(catalog_dir):
+        return None
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(catalog_dir)):
+        digest.update(name.encode())
+        digest.update(file_checksum(os.path.join(catalog_dir, name)).encode())
+    return digest.hexdigest()
+
+class ScoreTable:
+    """Base scores indexed by (trial, country code, logging policy code) and VPN"""
+
+    def __init__(self, scores, countries, logging_policies):
+        self.scores = scores
+        self.countries = int(countries)
+        self.logging_policies = int(logging_policies)
+
+    @property
+    def shape(self):
+        return (2, self.countries, self.logging_policies)
+
+    def row(self, user_features):
+        """Table row for the user's categorical features, or None if out of range"""
+        trial = user_features['trial_available']
+        country = user_features['country_encoded']
+        logging_policy = user_features['logging_policy_encoded']
+        if not (0 <= trial < 2 and 0 <= country < self.countries and 0 <= logging_policy < self.logging_policies):
+            return None
+        return (trial * self.countries + country) * self.logging_policies + logging_policy
+
+    def lookup(self, user_features, positions=None):
+        """Base scores of the given catalog rows, or None if the table has no such row"""
+        row = self.row(user_features)
+        if row is None:
+            return None
+        scores = self.scores[row]
+        return np.array(scores if positions is None else scores[positions])
+
+def compute_scores(engine):
+    """Model score of every VPN for every user combination, one model call per combination"""
+    countries = len(engine.encoders['country'])
+    logging_policies = len(engine.encoders['logging_policy'])
+    scores = np.empty((2 * countries * logging_policies, engine.size))
+    combinations = itertools.product(range(2), range(countries), range(logging_policies))
+    for row, (trial, country, logging_policy) in enumerate(combinations):
+        scores[row] = engine.score({
+            'trial_available': trial,
+            'country_encoded': country,
+            'logging_policy_encoded': logging_policy
+        }, use_table=False)
+    return ScoreTable(scores, countries, logging_policies)
+
+def export_score_table(engine, model_dir):
+    """Compute the table for ``engine`` and write it to <model_dir>/scores"""
+    fingerprint = catalog_fingerprint(model_dir)
+    if fingerprint is None:
+        raise ValueError(f"No catalog artifact in {model_dir} to precompute scores for")
+    table = compute_scores(engine)
+
+    manifest = {
+        'version': SCORES_VERSION,
+        'shape': list(table.shape),
+        'rows': engine.size,
+        'catalog_fingerprint': fingerprint,
+        'model_sha256': file_checksum(os.path.join(model_dir, 'model.pkl'))
+    }
+    return save_artifact_dir(os.path.join(model_dir, SCORES_DIRNAME), {'scores': table.scores}, manifest)
+
+def load_score_table(model_dir, encoders, rows, mmap_mode='r'):
+    """Load the score table, or None if it is missing or was computed for other artifacts"""
+    path = os.path.join(model_dir, SCORES_DIRNAME)
+    manifest = read_artifact_manifest(path, SCORES_VERSION, 'score table')
+    if manifest is None:
+        return None
+
+    shape = [2, len(encoders['country']), len(encoders['logging_policy'])]
+    if manifest.get('shape') != shape or manifest.get('rows') != rows:
+        reason = "it was computed for other encoders or another catalog size"
+    elif manifest.get('catalog_fingerprint') != catalog_fingerprint(model_dir):
+        reason = "the catalog has changed since"
+    elif manifest.get('model_sha256') != file_checksum(os.path.join(model_dir, 'model.pkl')):
+        reason = "the model has changed since"
+    else:
+        return ScoreTable(np.load(os.path.join(path, 'scores.npy'), mmap_mode=mmap_mode), shape[1], shape[2])
+    logger.warning(f"Ignoring precomputed scores in {path}: {reason}")
+    return None
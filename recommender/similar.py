@@ -0,0 +1,91 @@
+"""Nearest-neighbour lookup of similar VPNs.
+
+Every catalog row is described by its speed, price, device limit and the
+encoded encryption, country and logging policy, each standardized to zero
+mean and unit variance so no feature dominates the distance. KD-trees
+over these vectors answer "what is closest to X" in logarithmic time.
+
+There is one tree over the whole catalog and one per logging policy, so
+a logging policy filter picks a tree instead of discarding neighbours.
+Price and device filters are applied to the neighbours; when too few
+pass, the query is repeated with more neighbours. Past ``max_neighbors``
+the rows passing the filters are scanned directly, which bounds the cost
+of very selective filters.
+"""
+import numpy as np
+from sklearn.neighbors import KDTree
+
+SIMILARITY_FEATURES = [
+    'speed', 'price', 'max_devices',
+    'encryption_encoded', 'country_encoded', 'logging_policy_encoded'
+]
+
+class SimilarityIndex:
+    """KD-trees over the standardized similarity features of the catalog"""
+
+    def __init__(self, catalog, leaf_size=40, max_neighbors=1024):
+        X = np.column_stack([np.asarray(catalog[col], dtype=np.float64) for col in SIMILARITY_FEATURES])
+        self.mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        # Constant columns carry no information; keep them at 0
+        self.scale = np.where(scale > 0, scale, 1.0)
+        self.vectors = (X - self.mean) / self.scale
+        self.max_neighbors = max_neighbors
+        self.names = catalog['name']
+        self.price = catalog['price']
+        self.max_devices = catalog['max_devices']
+
+        # Logging policy (None = any) -> (tree, catalog positions of its rows)
+        self._trees = {None: (KDTree(self.vectors, leaf_size=leaf_size), np.arange(len(self.vectors)))}
+        logging_policy = np.asarray(catalog['logging_policy'])
+        for policy in np.unique(logging_policy):
+            rows = np.flatnonzero(logging_policy == policy)
+            self._trees[str(policy)] = (KDTree(self.vectors[rows], leaf_size=leaf_size), rows)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def _passes(self, rows, name, max_price, min_devices):
+        mask = np.ones(len(rows), dtype=bool)
+        if max_price is not None:
+            mask &= self.price[rows] <= max_price
+        if min_devices is not None:
+            mask &= self.max_devices[rows] >= min_devices
+        # String comparison is the costly part; only do it for the survivors
+        survivors = np.flatnonzero(mask)
+        mask[survivors] = np.asarray(self.names[rows[survivors]]) != name
+        return mask
+
+    def _scan(self, vector, rows, k, name, max_price, min_devices):
+        """Exact nearest neighbours among the rows passing the filters, by brute force"""
+        rows = rows[self._passes(rows, name, max_price, min_devices)]
+        diff = self.vectors[rows] - vector
+        squared = np.einsum('ij,ij->i', diff, diff)
+        if len(rows) > k:
+            best = np.argpartition(squared, k)[:k]
+            rows, squared = rows[best], squared[best]
+        order = np.lexsort((rows, squared))
+        return rows[order], np.sqrt(squared[order])
+
+    def query(self, position, k=5, max_price=None, logging_policy=None, min_devices=None):
+        """Positions and distances of the ``k`` rows closest to ``position`` that pass the filters.
+
+        Other rows with the same name (e.g. other plans of the same VPN)
+        are never returned.
+        """
+        if logging_policy not in self._trees:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        tree, rows_of = self._trees[logging_policy]
+        vector = self.vectors[position:position + 1]
+        name = self.names[position]
+        size = len(rows_of)
+        n = min(size, k + 1)
+        while True:
+            distances, found = tree.query(vector, k=n)
+            rows, distances = rows_of[found[0]], distances[0]
+            keep = self._passes(rows, name, max_price, min_devices)
+            if keep.sum() >= k or n == size:
+                return rows[keep][:k], distances[keep][:k]
+            if n >= self.max_neighbors:
+                return self._scan(vector[0], rows_of, k, name, max_price, min_devices)
+            n = min(size, n * 4)
@@ -0,0 +1,162 @@
+"""Out-of-core scoring over the memory-mapped catalog.
+
+``RecommendationEngine`` builds the full feature matrix, the filter index
+and the lowercased country names at load time, so its memory grows with
+the catalog. ``StreamingEngine`` keeps only the memory-mapped catalog
+columns and scans them in fixed-size chunks per request: each chunk is
+filtered, scored into preallocated buffers and merged into a bounded
+heap holding the current top-K. Peak memory depends on the chunk size,
+not the catalog size, and no request copies the full table.
+
+Results are identical to ``RecommendationEngine``: every score is
+computed row by row the same way, and ties are still broken by catalog
+position. Enable it with VPN_STREAM_CHUNK_ROWS.
+"""
+import heapq
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+from recommender.engine import (
+    COUNTRY_MATCH, DEFAULT_WEIGHTS, ENCODING, FEATURE_ORDER, FILTERING,
+    SCORING, STREAM_CHUNK_ROWS, TOP_K, USER_FEATURES, RecommendationEngine
+)
+from recommender.index import argtop_k
+from recommender.metrics import ENABLED as METRICS_ENABLED
+from recommender.similar import SimilarityIndex
+
+class StreamingEngine(RecommendationEngine):
+    """RecommendationEngine that scans the catalog in chunks instead of holding it in memory.
+
+    The similarity index is the exception: it is built in memory on the
+    first ``similar`` call.
+    """
+
+    def __init__(self, model, encoders, catalog, version=None, forest=None, score_table=None,
+                 chunk_rows=None):
+        self._init_artifacts(model, encoders, catalog, version, forest, score_table)
+        self.chunk_rows = chunk_rows or STREAM_CHUNK_ROWS or 65536
+        self._catalog_features = [(i, col) for i, col in enumerate(FEATURE_ORDER) if col not in USER_FEATURES]
+        self._similarity = None
+        self._similarity_lock = threading.Lock()
+
+    def _similarity_index(self):
+        # Built on first use, so engines that never answer similarity
+        # queries keep their memory independent of the catalog size
+        if self._similarity is None:
+            with self._similarity_lock:
+                if self._similarity is None:
+                    self._similarity = SimilarityIndex(self.catalog)
+        return self._similarity
+
+    def scoring_path(self, user_features, rows):
+        # Rows are scored a chunk at a time
+        return super().scoring_path(user_features, min(rows, self.chunk_rows))
+
+    def _lower_countries(self, positions):
+        return np.char.lower(np.asarray(self.catalog['country'][positions], dtype=str))
+
+    def _chunk_candidates(self, user_features, inputs, start, stop):
+        """Positions in [start, stop) passing the same hard filters as the filter index"""
+        mask = np.ones(stop - start, dtype=bool)
+        if user_features['logging_policy'] == 'no_logs':
+            mask &= self.catalog['logging_policy'][start:stop] == 'no_logs'
+        if 'max_devices' in inputs:
+            mask &= self.catalog['max_devices'][start:stop] >= user_features['max_devices']
+        return start + np.flatnonzero(mask)
+
+    def _candidates(self, user_features, inputs):
+        chunks = [self._chunk_candidates(user_features, inputs, start, min(start + self.chunk_rows, self.size))
+                  for start in range(0, self.size, self.chunk_rows)]
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+    def _fill_features(self, user_features, positions, X):
+        """Model input rows of ``positions`` written into the first rows of ``X``"""
+        X = X[:len(positions)]
+        for i, col in self._catalog_features:
+            X[:, i] = self.catalog[col][positions]
+        for feature in USER_FEATURES:
+            X[:, FEATURE_ORDER.index(feature)] = user_features[feature]
+        return X
+
+    def _feature_matrix(self, user_features, positions=None):
+        positions = np.arange(self.size) if positions is None else np.asarray(positions)
+        return self._fill_features(user_features, positions, np.empty((len(positions), len(FEATURE_ORDER))))
+
+    def score(self, user_features, positions=None, use_table=True):
+        """Model score (0-100) of the given catalog rows, one chunk at a time"""
+        if use_table and self.score_table is not None:
+            scores = self.score_table.lookup(user_features, positions)
+            if scores is not None:
+                return scores
+        positions = np.arange(self.size) if positions is None else np.asarray(positions)
+        scores = np.empty(len(positions))
+        X = np.empty((min(self.chunk_rows, len(positions)), len(FEATURE_ORDER)), order='F')
+        for start in range(0, len(positions), self.chunk_rows):
+            chunk = positions[start:start + self.chunk_rows]
+            scores[start:start + len(chunk)] = self._predict(self._fill_features(user_features, chunk, X))
+        return scores
+
+    def _chunk_scores(self, user_features, positions, X):
+        """Model scores of ``positions``, built in the preallocated matrix ``X``"""
+        if self.score_table is not None:
+            scores = self.score_table.lookup(user_features, positions)
+            if scores is not None:
+                return scores
+        return self._predict(self._fill_features(user_features, positions, X))
+
+    def recommend_batch(self, profiles, top_k=5, weights=None):
+        """Top VPNs for each profile from one pass over the catalog.
+
+        Each chunk is read once for all profiles. Per profile, a min-heap of
+        ``(score, -position, base score)`` keeps the best ``top_k`` rows seen
+        so far, so equal scores still prefer the earlier catalog row.
+        """
+        if self.size == 0:
+            return [pd.DataFrame(columns=['vpn_name', 'country', 'score']) for _ in profiles]
+
+        with ENCODING.time():
+            user_features = [self._user_features(inputs) for inputs in profiles]
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        heaps = [[] for _ in profiles]
+        # Column-major so filling a feature column writes contiguous memory
+        X = np.empty((self.chunk_rows, len(FEATURE_ORDER)), order='F')
+        elapsed = dict.fromkeys([FILTERING, SCORING, COUNTRY_MATCH, TOP_K], 0.0)
+
+        for start in range(0, self.size, self.chunk_rows):
+            stop = min(start + self.chunk_rows, self.size)
+            for features, inputs, heap in zip(user_features, profiles, heaps):
+                t0 = time.perf_counter()
+                positions = self._chunk_candidates(features, inputs, start, stop)
+                t1 = time.perf_counter()
+                elapsed[FILTERING] += t1 - t0
+                if not len(positions):
+                    continue
+                base_score = self._chunk_scores(features, positions, X)
+                t2 = time.perf_counter()
+                country_match = self._country_match(features['country'], positions)
+                t3 = time.perf_counter()
+                personalized_score = self._combine(features, positions, base_score, country_match, weights)
+                for i in argtop_k(personalized_score, top_k):
+                    entry = (personalized_score[i], -positions[i], base_score[i])
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                t4 = time.perf_counter()
+                elapsed[SCORING] += t2 - t1
+                elapsed[COUNTRY_MATCH] += t3 - t2
+                elapsed[TOP_K] += t4 - t3
+        if METRICS_ENABLED:
+            for child, seconds in elapsed.items():
+                child.record(seconds)
+
+        results = []
+        for heap in heaps:
+            best = sorted(heap, key=lambda entry: (-entry[0], -entry[1]))
+            top = np.array([-entry[1] for entry in best], dtype=np.int64)
+            results.append(self._results(
+                top, np.array([entry[2] for entry in best]), np.array([entry[0] for entry in best])
+            ))
+        return results
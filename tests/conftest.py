@@ -0,0 +1,30 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from recommender.catalog import CATALOG_DIRNAME, DATA_PATH, MODEL_DIR
+from recommender.engine import RecommendationEngine
+from recommender.forest import FOREST_DIRNAME
+
+@pytest.fixture(scope='session')
+def engine():
+    """Engine over the artifacts checked into models/"""
+    return RecommendationEngine.load(MODEL_DIR, data_path=DATA_PATH)
+
+@pytest.fixture
+def model_copy(tmp_path):
+    """Writable copy of the models/ artifacts"""
+    target = tmp_path / 'models'
+    target.mkdir()
+    for name in os.listdir(MODEL_DIR):
+        source = os.path.join(MODEL_DIR, name)
+        if (name.endswith('.pkl') and not name.startswith('preferences')) or name == 'manifest.json':
+            shutil.copy2(source, target)
+        elif name in (CATALOG_DIRNAME, FOREST_DIRNAME):
+            shutil.copytree(source, target / name)
+    return str(target)
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from recommender.bundle import (
+    BundleError, current_version, publish_bundle, read_manifest, resolve_model_dir, write_manifest
+)
+from recommender.engine import RecommendationEngine
+
+def test_publish_and_resolve(tmp_path, model_copy):
+    bundles = str(tmp_path / 'bundles')
+    target = publish_bundle(model_copy, bundles)
+
+    assert current_version(bundles) == os.path.basename(target)
+    assert resolve_model_dir(model_copy, bundles) == target
+    assert read_manifest(target)['files'] == read_manifest(model_copy)['files']
+
+def test_republishing_the_same_artifacts_keeps_the_version(tmp_path, model_copy):
+    bundles = str(tmp_path / 'bundles')
+    assert publish_bundle(model_copy, bundles) == publish_bundle(model_copy, bundles)
+
+def test_tampered_bundle_is_rejected(tmp_path, model_copy):
+    target = publish_bundle(model_copy, str(tmp_path / 'bundles'))
+    with open(os.path.join(target, 'enc_country.pkl'), 'ab') as f:
+        f.write(b'x')
+    with pytest.raises(BundleError, match='enc_country.pkl'):
+        read_manifest(target)
+
+def test_missing_file_is_rejected(model_copy):
+    write_manifest(model_copy)
+    os.remove(os.path.join(model_copy, 'enc_country.pkl'))
+    with pytest.raises(BundleError, match='missing'):
+        read_manifest(model_copy)
+
+def test_edited_working_directory_still_loads(model_copy):
+    write_manifest(model_copy)
+    with open(os.path.join(model_copy, 'manifest.json'), 'r+', encoding='utf-8') as f:
+        manifest = f.read().replace('"model.pkl": "', '"model.pkl": "0')
+        f.seek(0)
+        f.write(manifest)
+
+    engine = RecommendationEngine.load(model_copy, data_path=None)
+    assert engine.size > 0
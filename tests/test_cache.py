@@ -0,0 +1,51 @@
+import pandas as pd
+
+from recommender.cache import ResultCache
+
+PROFILE = {'speed': 5, 'price': 10, 'logging_policy': 'no_logs', 'encryption': 'AES-256',
+           'trial_available': 'Yes', 'country': ' Finland '}
+
+def test_cached_results_equal_fresh_results(engine):
+    cache = ResultCache(maxsize=8, ttl=None)
+    compute = lambda normalized: engine.recommend(normalized)
+
+    first = cache.get_or_compute(PROFILE, engine.version, compute)
+    second = cache.get_or_compute(PROFILE, engine.version, compute)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    pd.testing.assert_frame_equal(first, engine.recommend(PROFILE))
+    pd.testing.assert_frame_equal(second, first)
+
+def test_callers_get_independent_copies():
+    cache = ResultCache(maxsize=8, ttl=None)
+    compute = lambda normalized: pd.DataFrame({'score': [1.0]})
+
+    cache.get_or_compute(PROFILE, 'v1', compute)['score'] = 0.0
+    assert cache.get_or_compute(PROFILE, 'v1', compute)['score'].tolist() == [1.0]
+
+def test_new_version_drops_old_entries():
+    cache = ResultCache(maxsize=8, ttl=None)
+    calls = []
+    compute = lambda normalized: calls.append(1) or pd.DataFrame()
+
+    cache.get_or_compute(PROFILE, 'v1', compute)
+    cache.get_or_compute(PROFILE, 'v2', compute)
+    cache.get_or_compute(PROFILE, 'v2', compute)
+
+    assert len(calls) == 2
+    assert cache.stats()['size'] == 1
+
+def test_lru_eviction_and_ttl():
+    cache = ResultCache(maxsize=2, ttl=0.0)
+    compute = lambda normalized: pd.DataFrame()
+    for speed in (1, 2, 3):
+        cache.get_or_compute(dict(PROFILE, speed=speed), 'v1', compute)
+    assert cache.evictions == 1
+    # Expired immediately
+    cache.get_or_compute(dict(PROFILE, speed=3), 'v1', compute)
+    assert cache.hits == 0
+
+def test_normalization_matches_what_the_engine_sees():
+    cache = ResultCache(quantize=0.5)
+    normalized = cache.normalize({'speed': '5.2', 'price': 9.8, 'trial_available': ' YES ', 'country': ' Finland '})
+    assert normalized == {'speed': 5.0, 'price': 10.0, 'trial_available': 'yes', 'country': 'Finland'}
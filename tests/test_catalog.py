@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from recommender.catalog import DATA_PATH, build_catalog, load_catalog, save_catalog
+from recommender.engine import load_encoders
+
+def test_artifact_matches_catalog_built_from_csv(model_copy):
+    expected = build_catalog(pd.read_csv(DATA_PATH), load_encoders(model_copy))
+    catalog = load_catalog(model_copy, source_path=DATA_PATH)
+
+    assert catalog is not None
+    assert set(catalog) == set(expected)
+    for name, values in expected.items():
+        np.testing.assert_array_equal(catalog[name], values, err_msg=name)
+
+def test_save_and_load_round_trip(tmp_path, model_copy):
+    columns = build_catalog(pd.read_csv(DATA_PATH).head(10), load_encoders(model_copy))
+    save_catalog(columns, str(tmp_path))
+
+    loaded = load_catalog(str(tmp_path))
+    for name, values in columns.items():
+        np.testing.assert_array_equal(loaded[name], values)
+    assert not os.path.exists(tmp_path / 'catalog.tmp')
+    assert not os.path.exists(tmp_path / 'catalog.old')
+
+def test_stale_artifact_is_ignored(tmp_path, model_copy):
+    csv = tmp_path / 'vpns.csv'
+    df = pd.read_csv(DATA_PATH)
+    df.to_csv(csv, index=False)
+    save_catalog(build_catalog(df, load_encoders(model_copy)), model_copy, source_path=str(csv))
+    assert load_catalog(model_copy, source_path=str(csv)) is not None
+
+    df.loc[0, 'price'] += 1
+    df.to_csv(csv, index=False)
+    assert load_catalog(model_copy, source_path=str(csv)) is None
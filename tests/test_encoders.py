@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+import pytest
+from joblib import load
+
+from recommender.catalog import ENCODED_COLUMNS, MODEL_DIR
+from recommender.encoders import FrozenEncoder
+from recommender.parity import safe_encode
+
+@pytest.fixture(scope='module', params=ENCODED_COLUMNS)
+def label_encoder(request):
+    return load(os.path.join(MODEL_DIR, f'enc_{request.param}.pkl'))
+
+def test_encode_matches_label_encoder(label_encoder):
+    frozen = FrozenEncoder.from_label_encoder(label_encoder)
+    values = list(label_encoder.classes_) + ['Unknown', 'Not-a-category', '', None, 3]
+    for value in values:
+        assert frozen.encode(value) == safe_encode(label_encoder, value), value
+
+def test_encode_array_matches_encode(label_encoder):
+    frozen = FrozenEncoder.from_label_encoder(label_encoder)
+    values = np.array(list(label_encoder.classes_) * 2 + ['Not-a-category'], dtype=object)
+    np.testing.assert_array_equal(frozen.encode_array(values), [frozen.encode(v) for v in values])
+
+def test_unhashable_value_maps_to_unknown():
+    frozen = FrozenEncoder(['A', 'Unknown'])
+    assert frozen.encode(['A']) == frozen.encode('Unknown') == 1
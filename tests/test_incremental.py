@@ -0,0 +1,45 @@
+from copy import deepcopy
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+from recommender.catalog import DATA_PATH, ENCODED_COLUMNS, build_catalog, load_catalog, patch_catalog, save_catalog
+from recommender.encoders import FrozenEncoder, extend_label_encoder
+
+def label_encoders(model_dir):
+    return {col: load(f'{model_dir}/enc_{col}.pkl') for col in ENCODED_COLUMNS}
+
+def test_patch_matches_a_full_rebuild(model_copy):
+    encoders = label_encoders(model_copy)
+    frozen = {col: FrozenEncoder.from_label_encoder(encoder) for col, encoder in encoders.items()}
+    save_catalog(build_catalog(pd.read_csv(DATA_PATH), frozen), model_copy)
+
+    df = pd.read_csv(DATA_PATH)
+    df.loc[3, 'price'] += 1
+    df = df.drop(index=7)
+    extra = df.iloc[[0]].assign(name='Brand New VPN', country='Atlantis')
+    df = pd.concat([df, extra], ignore_index=True)
+    for col, encoder in encoders.items():
+        extend_label_encoder(encoder, df[col].astype(str))
+    frozen = {col: FrozenEncoder.from_label_encoder(encoder) for col, encoder in encoders.items()}
+
+    rebuilt = patch_catalog(df, frozen, model_copy)
+    patched = load_catalog(model_copy)
+    expected = build_catalog(df, frozen)
+
+    assert rebuilt == 2
+    assert set(patched) == set(expected)
+    for name, values in expected.items():
+        np.testing.assert_array_equal(patched[name], values, err_msg=name)
+
+def test_extend_keeps_existing_codes(model_copy):
+    for encoder in label_encoders(model_copy).values():
+        before = FrozenEncoder.from_label_encoder(deepcopy(encoder))
+        added = extend_label_encoder(encoder, ['zzz-new', 'aaa-new', encoder.classes_[0]])
+        after = FrozenEncoder.from_label_encoder(encoder)
+
+        assert added == ['aaa-new', 'zzz-new']
+        for value in before.classes:
+            assert after.encode(value) == before.encode(value)
+        assert after.encode('aaa-new') == len(before)
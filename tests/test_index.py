@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommender.index import FilterIndex, argtop_k
+
+@pytest.fixture(scope='module')
+def columns():
+    rng = np.random.default_rng(0)
+    logging_policy = rng.choice(['no_logs', 'partial_logs'], 500)
+    max_devices = rng.integers(1, 12, 500)
+    return logging_policy, max_devices
+
+@pytest.mark.parametrize('logging_policy', [None, 'no_logs', 'partial_logs', 'full_logs'])
+@pytest.mark.parametrize('min_devices', [None, 0, 1, 5, 11, 12])
+def test_candidates_match_a_full_scan(columns, logging_policy, min_devices):
+    policies, devices = columns
+    mask = np.ones(len(devices), dtype=bool)
+    if logging_policy is not None:
+        mask &= policies == logging_policy
+    if min_devices is not None:
+        mask &= devices >= min_devices
+
+    candidates = FilterIndex(policies, devices).candidates(logging_policy, min_devices)
+    np.testing.assert_array_equal(candidates, np.flatnonzero(mask))
+
+@pytest.mark.parametrize('k', [0, 1, 5, 50, 299])
+def test_argtop_k_matches_nlargest(k):
+    # Few distinct values, so many ties have to be broken by position
+    scores = np.random.default_rng(1).integers(0, 20, 300).astype(float)
+    expected = pd.Series(scores).nlargest(k, keep='first').index.to_numpy()
+    np.testing.assert_array_equal(argtop_k(scores, k), expected)
+
+def test_argtop_k_beyond_the_length_sorts_everything():
+    # nlargest falls back to an unstable sort here; ties still go by position
+    scores = np.array([1.0, 3.0, 1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(argtop_k(scores, 10), [1, 4, 3, 0, 2])
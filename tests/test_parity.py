@@ -0,0 +1,36 @@
+"""The engine against the original CSV -> LabelEncoder -> per-row predict_proba pipeline"""
+import numpy as np
+import pytest
+
+from recommender.parity import baseline_frame, baseline_recommend, check_forest_parity, check_parity
+
+PROFILES = [
+    {'speed': 5, 'price': 5, 'max_devices': 1, 'logging_policy': 'no_logs',
+     'encryption': 'AES-256', 'trial_available': 'yes', 'country': ''},
+    {'speed': 50, 'price': 12.5, 'max_devices': 5, 'logging_policy': 'partial_logs',
+     'encryption': 'ChaCha20', 'trial_available': 'no', 'country': 'France'},
+    {'speed': 20, 'price': 8, 'logging_policy': 'partial_logs',
+     'encryption': 'AES-128', 'trial_available': 'yes', 'country': 'Nowhere'},
+    {'price': 3, 'logging_policy': 'no_logs', 'encryption': 'Blowfish-128', 'trial_available': 'no'},
+]
+
+@pytest.fixture(scope='module')
+def baseline():
+    return baseline_frame()
+
+@pytest.mark.parametrize('inputs', PROFILES)
+def test_recommendations_match_baseline(engine, baseline, inputs):
+    df, encoders = baseline
+    expected = baseline_recommend(engine.model, df, encoders, inputs)
+    results = engine.recommend(inputs)
+
+    assert results['vpn_name'].tolist() == expected['name'].tolist()
+    np.testing.assert_array_equal(results['score'].to_numpy(), expected['base_score'].to_numpy())
+    np.testing.assert_array_equal(results['personalized_score'].to_numpy(),
+                                  expected['personalized_score'].to_numpy())
+
+def test_catalog_scores_match_per_row_scores(engine):
+    assert check_parity(engine, PROFILES[:2], atol=0.0) == 0.0
+
+def test_flattened_forest_matches_sklearn(engine):
+    assert check_forest_parity(engine) == 0.0
@@ -0,0 +1,81 @@
+import itertools
+
+import numpy as np
+import pytest
+from joblib import dump
+
+from recommender.engine import DEFAULT_WEIGHTS, PREFERENCE_POINTS
+from recommender.preferences import PreferenceLearner, PreferenceService, Weights
+from recommender.recommend import weights_bucket
+
+PROFILE = {'speed': 5, 'price': 10, 'logging_policy': 'partial_logs', 'encryption': 'AES-256',
+           'trial_available': 'yes', 'country': 'Switzerland'}
+
+def burst(engine, name, ratings=50):
+    """Alternating ratings for one VPN, learned in feedback-sized batches"""
+    service = PreferenceService(snapshot_path=None, batch_size=8)
+    features = engine.preference_features(name)
+    batch = [(features, i % 2) for i in range(ratings)]
+    for start in range(0, len(batch), service.batch_size):
+        service._learn(batch[start:start + service.batch_size])
+    return service.weights
+
+def extreme_feedback(engine, ratings=2000, seed=0):
+    """Many ratings favouring expensive, slow VPNs"""
+    rng = np.random.default_rng(seed)
+    learner = PreferenceLearner()
+    names = engine.catalog['name']
+    for _ in range(ratings // 50):
+        rows = rng.integers(0, engine.size, 50)
+        X = [engine.preference_features(names[row]) for row in rows]
+        y = [int(engine.catalog['price'][row] > 8) for row in rows]
+        learner.update_batch(X, y)
+    return learner.get_weights()
+
+def scores(engine, weights):
+    results = engine.recommend(PROFILE, top_k=engine.size, weights=weights)
+    return results.set_index('vpn_name')['personalized_score']
+
+def test_learned_weights_are_bounded(engine):
+    for weights in [burst(engine, 'AirVPN').values, extreme_feedback(engine)]:
+        assert np.all(weights >= 0)
+        assert weights.sum() <= 1 + 1e-12
+
+@pytest.mark.parametrize('weights', [[1, 0, 0, 0], [0, 1, 0, 0], [0.5, 0.5, 0, 0]])
+def test_personalization_shift_is_bounded(engine, weights):
+    baseline = scores(engine, DEFAULT_WEIGHTS)
+    shifted = scores(engine, np.array(weights, dtype=float))[baseline.index]
+    assert np.max(np.abs(shifted - baseline)) <= PREFERENCE_POINTS
+
+def test_feedback_burst_cannot_reorder_beyond_the_range(engine):
+    baseline = scores(engine, DEFAULT_WEIGHTS)
+    for weights in [burst(engine, 'AirVPN').values, extreme_feedback(engine)]:
+        shifted = scores(engine, weights)[baseline.index]
+        assert np.max(np.abs(shifted - baseline)) <= PREFERENCE_POINTS
+        # A VPN that led by more than the whole range still leads
+        for a, b in itertools.combinations(baseline.index, 2):
+            if baseline[a] - baseline[b] > PREFERENCE_POINTS:
+                assert shifted[a] > shifted[b], (a, b)
+
+def test_cache_key_ignores_weight_versions():
+    values = np.array([0.1, 0.2, 0.0, 0.0])
+    assert weights_bucket(Weights(1, values).values) == weights_bucket(Weights(2, values + 0.001).values)
+    assert weights_bucket(values) != weights_bucket(values + 0.1)
+
+def test_snapshot_round_trip(tmp_path, engine):
+    path = str(tmp_path / 'preferences.pkl')
+    service = PreferenceService(snapshot_path=path)
+    service._learn([(engine.preference_features('AirVPN'), 1), (engine.preference_features('Mullvad'), 0)])
+    service.snapshot()
+
+    restored = PreferenceService(snapshot_path=path)
+    restored.restore()
+    assert restored.weights.version == service.weights.version
+    np.testing.assert_array_equal(restored.weights.values, service.weights.values)
+
+def test_unscaled_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / 'preferences.pkl')
+    dump({'version': 7, 'model': PreferenceLearner().model}, path)
+    service = PreferenceService(snapshot_path=path)
+    service.restore()
+    assert service.weights.version == 0
@@ -0,0 +1,36 @@
+import os
+
+import pandas as pd
+
+from benchmarks.replay import form_data, load_requests, parse_line, recorded_inputs
+from recommender.catalog import BASE_DIR
+
+LEGACY_LOG = os.path.join(BASE_DIR, 'vpn_recommendations.log')
+
+def test_numeric_trial_flags_become_yes_no():
+    assert recorded_inputs({'trial_available': 1, 'speed': 5})['trial_available'] == 'yes'
+    assert recorded_inputs({'trial_available': 0})['trial_available'] == 'no'
+    assert recorded_inputs({'trial_available': False})['trial_available'] == 'no'
+    assert recorded_inputs({'trial_available': 'yes'})['trial_available'] == 'yes'
+    assert recorded_inputs([{'trial_available': 1}]) == [{'trial_available': 'yes'}]
+
+def test_in_process_and_http_targets_see_the_same_trial_flag():
+    inputs = {'speed': 5, 'price': 8, 'trial_available': 1, 'country': None}
+    assert form_data(inputs)['trial_available'] == recorded_inputs(inputs)['trial_available']
+
+def test_recorded_trial_flag_scores_like_yes(engine):
+    inputs = {'speed': 5, 'price': 8, 'logging_policy': 'partial_logs', 'trial_available': 1}
+    pd.testing.assert_frame_equal(engine.recommend(recorded_inputs(inputs)),
+                                  engine.recommend(dict(inputs, trial_available='yes')))
+
+def test_parse_line_formats():
+    assert parse_line("INFO - User inputs: {'speed': 5, 'trial_available': 1}")['inputs'] == \
+        {'speed': 5, 'trial_available': 1}
+    record = parse_line('{"endpoint": "/api/v1/recommend", "inputs": {"speed": 5}, "top_k": ["A", "B"]}')
+    assert record == {'endpoint': '/api/v1/recommend', 'inputs': {'speed': 5}, 'top_k': 2}
+    assert parse_line('not a request') is None
+
+def test_legacy_log_is_replayable():
+    requests, _ = load_requests([LEGACY_LOG])
+    assert requests
+    assert all(isinstance(recorded_inputs(r['inputs']).get('trial_available', 'no'), str) for r in requests)
@@ -0,0 +1,46 @@
+import os
+import json
+
+from app.request_log import JsonLinesHandler, RequestLog
+
+RESULTS = [{'vpn_name': 'Perfect Privacy', 'personalized_score': 43.0}]
+
+def log_request(log, country='Schweiz/Suisse/Svizzera/Svizra 中国'):
+    log.log('/recommend', {'country': country}, RESULTS, 'v1', 0, {'scoring': 0.001}, 0.002)
+
+def test_lines_are_replayable_json(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    log = RequestLog(path)
+    log.start()
+    log_request(log)
+    log.log('/api/v1/recommend', {'speed': 5}, [], None, 0, {}, 0.001, status=503)
+    log.stop()
+
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [r['status'] for r in records] == [200, 503]
+    assert records[0]['top_k'] == ['Perfect Privacy']
+    assert records[0]['timings_ms'] == {'scoring': 1.0}
+
+def test_rotation_counts_bytes(tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    handler = JsonLinesHandler(path, max_bytes=1000, backup_count=3, batch_size=1)
+    line = {'country': 'Κύπρος - Kıbrıs 日本 ' * 5}
+    for _ in range(20):
+        handler.emit(type('Record', (), {'msg': line})())
+    handler.close()
+
+    files = [path] + [f'{path}.{i}' for i in range(1, 4)]
+    assert all(os.path.getsize(name) <= 1000 for name in files if os.path.exists(name))
+    assert os.path.exists(f'{path}.1')
+
+def test_dropped_count_survives_stop(tmp_path):
+    log = RequestLog(str(tmp_path / 'requests.jsonl'), max_queue=1)
+    log.start()
+    for _ in range(5000):
+        log_request(log)
+    dropped = log.dropped
+    log.stop()
+
+    assert dropped > 0
+    assert log.dropped >= dropped
@@ -0,0 +1,36 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from recommender.catalog import DATA_PATH, build_catalog, save_catalog
+from recommender.engine import RecommendationEngine
+from recommender.score_table import export_score_table, load_score_table
+
+def test_table_matches_model_scores(model_copy):
+    engine = RecommendationEngine.load(model_copy, data_path=None)
+    export_score_table(engine, model_copy)
+    engine = RecommendationEngine.load(model_copy, data_path=None)
+    assert engine.score_table is not None
+
+    countries = len(engine.encoders['country'])
+    policies = len(engine.encoders['logging_policy'])
+    positions = np.arange(0, engine.size, 3)
+    for trial, country, policy in itertools.product(range(2), range(countries), range(policies)):
+        features = {'trial_available': trial, 'country_encoded': country, 'logging_policy_encoded': policy}
+        np.testing.assert_array_equal(engine.score(features), engine.score(features, use_table=False))
+        np.testing.assert_array_equal(engine.score(features, positions),
+                                      engine.score(features, positions, use_table=False))
+
+def test_recommendations_are_unchanged(model_copy):
+    profile = {'speed': 5, 'price': 8, 'logging_policy': 'partial_logs', 'trial_available': 'yes',
+               'country': 'Finland', 'max_devices': 3}
+    expected = RecommendationEngine.load(model_copy, data_path=None).recommend(profile)
+    export_score_table(RecommendationEngine.load(model_copy, data_path=None), model_copy)
+    pd.testing.assert_frame_equal(RecommendationEngine.load(model_copy, data_path=None).recommend(profile), expected)
+
+def test_table_for_another_catalog_is_ignored(model_copy):
+    engine = RecommendationEngine.load(model_copy, data_path=None)
+    export_score_table(engine, model_copy)
+    save_catalog(build_catalog(pd.read_csv(DATA_PATH).head(50), engine.encoders), model_copy)
+    assert load_score_table(model_copy, engine.encoders, 50) is None
@@ -0,0 +1,18 @@
+import numpy as np
+
+import recommender.engine as engine_module
+
+PROFILE = {'speed': 5, 'price': 8, 'logging_policy': 'partial_logs', 'trial_available': 'yes', 'country': 'France'}
+
+def test_path_follows_the_forest_cutoff(engine, monkeypatch):
+    monkeypatch.setattr(engine_module, 'FOREST_MAX_ROWS', 100)
+    features = engine._user_features(PROFILE)
+    assert engine.scoring_path(features, 100) == 'forest'
+    assert engine.scoring_path(features, 101) == 'sklearn'
+
+def test_both_sides_of_the_cutoff_score_alike(engine, monkeypatch):
+    features = engine._user_features(PROFILE)
+    monkeypatch.setattr(engine_module, 'FOREST_MAX_ROWS', engine.size)
+    forest = engine.score(features)
+    monkeypatch.setattr(engine_module, 'FOREST_MAX_ROWS', 0)
+    np.testing.assert_array_equal(engine.score(features), forest)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from recommender.similar import SimilarityIndex
+
+def brute_force(index, position, k, max_price=None, logging_policy=None, min_devices=None, policies=None):
+    """Closest rows passing the filters by scanning every row; ties by position"""
+    mask = np.asarray(index.names) != index.names[position]
+    if max_price is not None:
+        mask &= index.price <= max_price
+    if min_devices is not None:
+        mask &= index.max_devices >= min_devices
+    if logging_policy is not None:
+        mask &= policies == logging_policy
+    rows = np.flatnonzero(mask)
+    distances = np.sqrt(((index.vectors[rows] - index.vectors[position]) ** 2).sum(axis=1))
+    order = np.lexsort((rows, distances))[:k]
+    return rows[order], distances[order]
+
+@pytest.fixture(scope='module')
+def index(engine):
+    return SimilarityIndex(engine.catalog, max_neighbors=16)
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'max_price': 5},
+    {'logging_policy': 'no_logs'},
+    {'logging_policy': 'partial_logs', 'min_devices': 5},
+    {'max_price': 2, 'min_devices': 10},
+])
+def test_query_matches_brute_force(engine, index, filters):
+    policies = np.asarray(engine.catalog['logging_policy'])
+    for position in range(0, engine.size, 7):
+        rows, distances = index.query(position, 5, **filters)
+        expected_rows, expected_distances = brute_force(index, position, 5, policies=policies, **filters)
+        np.testing.assert_allclose(distances, expected_distances, rtol=0, atol=1e-12)
+        # Rows tied with the last neighbour may be swapped for each other
+        if len(expected_rows):
+            closer = expected_distances < expected_distances[-1] - 1e-12
+            assert set(expected_rows[closer]) <= set(rows)
+
+def test_unknown_logging_policy_finds_nothing(index):
+    rows, distances = index.query(0, 5, logging_policy='full_logs')
+    assert len(rows) == len(distances) == 0
+
+def test_similar_never_returns_the_same_vpn(engine):
+    name = str(engine.catalog['name'][0])
+    assert all(record['vpn_name'] != name for record in engine.similar(name, top_k=10))
@@ -0,0 +1,36 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommender.parity import check_forest_parity, check_parity, sample_profiles
+from recommender.score_table import compute_scores
+from recommender.streaming import StreamingEngine
+
+@pytest.fixture(scope='module')
+def streaming(engine):
+    # An odd chunk size, so chunks do not line up with anything in the catalog
+    return StreamingEngine(engine.model, engine.encoders, engine.catalog, version=engine.version,
+                           forest=engine.forest, chunk_rows=17)
+
+def test_recommendations_match(engine, streaming):
+    profiles = list(itertools.islice(sample_profiles(engine), 40))
+    for expected, result in zip(engine.recommend_batch(profiles, top_k=7), streaming.recommend_batch(profiles, top_k=7)):
+        pd.testing.assert_frame_equal(result, expected)
+
+def test_scores_and_candidates_match(engine, streaming):
+    positions = np.arange(0, engine.size, 5)
+    for inputs in list(itertools.islice(sample_profiles(engine), 20)):
+        features = engine._user_features(inputs)
+        np.testing.assert_array_equal(streaming._candidates(features, inputs), engine._candidates(features, inputs))
+        np.testing.assert_allclose(streaming.score(features), engine.score(features), rtol=0, atol=1e-9)
+        np.testing.assert_allclose(streaming.score(features, positions), engine.score(features, positions),
+                                   rtol=0, atol=1e-9)
+
+def test_offline_tools_accept_streaming_engine(engine, streaming):
+    check_parity(streaming, profiles=list(itertools.islice(sample_profiles(engine), 2)))
+    check_forest_parity(streaming)
+    # Every combination scores the whole catalog; coarser chunks keep this quick
+    coarse = StreamingEngine(engine.model, engine.encoders, engine.catalog, forest=engine.forest, chunk_rows=100)
+    np.testing.assert_allclose(compute_scores(coarse).scores, compute_scores(engine).scores, rtol=0, atol=1e-9)